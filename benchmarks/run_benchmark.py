@@ -0,0 +1,168 @@
+"""Offline benchmark of a main_unified check cycle.
+
+Starts the stub APIs from stub_servers.py, points every provider at them
+and runs one cold cycle (nothing cached) and one warm cycle (identical
+responses) for each watch-list size. Cycle time includes delivering the
+resulting notifications to a file sink. Reports cycle wall time, requests per
+second, parse time per coach and peak traced memory (per cycle and per parsed
+response). Memory is measured in separate passes so tracing doesn't slow the
+timed ones.
+
+    python -m benchmarks.run_benchmark
+    python -m benchmarks.run_benchmark --sizes 1 10 100 --latency 0.2 --coaches 80
+"""
+import argparse
+import contextlib
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.stub_servers import StubConfig, start_stub  # noqa: E402
+
+
+def configure_environment(workdir, workers, verbose=False):
+    """Settings for a quiet, unthrottled, fully local run. Must happen before importing the monitor."""
+    os.environ.update({
+        "TRAVEL_DATE": date.today().isoformat(),
+        "SEARCH_ONWORD": "True",
+        "SEARCH_RETURN": "False",
+        "STATE_DB": os.path.join(workdir, "bench_state.db"),
+        "NOTIFY_SINKS": "file",
+        "NOTIFY_FILE": os.path.join(workdir, "bench_notifications.jsonl"),
+        "NOTIFY_COALESCE_SECONDS": "0",
+        "BDTICKETS_MAX_WORKERS": str(workers),
+        "BUSBD_MAX_WORKERS": str(workers),
+        "BDTICKETS_RATE_PER_SECOND": "0",
+        "BUSBD_RATE_PER_SECOND": "0",
+        "BREAKER_FAILURE_THRESHOLD": "1000000",
+        # Log lines are written by a background thread, so silence them at the source
+        "LOG_LEVEL": "INFO" if verbose else "CRITICAL",
+    })
+
+
+def build_queries(monitor, size):
+    """`size` onward queries spread over as many future dates as needed"""
+    queries = []
+    day = date.today()
+    while len(queries) < size:
+        day += timedelta(days=1)
+        for provider in monitor.PROVIDERS:
+            queries.extend((provider, query) for query in provider.build_queries(day.isoformat(), "Onward"))
+    return queries[:size]
+
+
+def measure_parse(monitor, queries, repeat=3):
+    """(seconds per coach, peak traced bytes) of provider.parse_response on one real response per provider"""
+    per_coach = {}
+    for provider in monitor.PROVIDERS:
+        provider_queries = [query for owner, query in queries if owner is provider]
+        if not provider_queries:
+            continue
+        query = provider_queries[0]
+        response = provider.request(query)
+        best = None
+        coaches = 0
+        for _ in range(repeat):
+            start = time.perf_counter()
+            coaches = len(provider.parse_response(query, response, _AllCompanies()))
+            elapsed = time.perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+        tracemalloc.start()
+        provider.parse_response(query, response, _AllCompanies())
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        per_coach[provider.name] = (best / max(1, coaches), peak)
+    return per_coach
+
+
+class _AllCompanies:
+    """Target set that accepts every company, so parsing does full work"""
+    def __contains__(self, item):
+        return True
+
+
+def run_cycle(monitor, queries, quiet):
+    with quiet:
+        monitor.run_cycle(queries)
+        monitor.get_notifier().flush()
+
+
+def timed_cycle(monitor, queries, quiet):
+    """(seconds, requests) of one cycle. Not traced: tracemalloc also slows the in-process stub server."""
+    start_requests = sum(stub.config.requests for stub in STUBS)
+    start = time.perf_counter()
+    run_cycle(monitor, queries, quiet)
+    elapsed = time.perf_counter() - start
+    requests = sum(stub.config.requests for stub in STUBS) - start_requests
+    return elapsed, requests
+
+
+def traced_cycle(monitor, queries, quiet):
+    """Peak traced bytes of one cycle, measured in a pass of its own"""
+    tracemalloc.start()
+    run_cycle(monitor, queries, quiet)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return peak
+
+
+STUBS = []
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1, 10, 100, 1000])
+    parser.add_argument("--latency", type=float, default=0.05, help="stub response latency in seconds")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of stub requests that return 503")
+    parser.add_argument("--coaches", type=int, default=20, help="coaches per stub response")
+    parser.add_argument("--workers", type=int, default=8, help="per-provider concurrency cap")
+    parser.add_argument("--verbose", action="store_true", help="show monitor log output")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="ticket-bench-")
+    configure_environment(workdir, args.workers, args.verbose)
+
+    config = StubConfig(args.latency, args.error_rate, args.coaches)
+    server, base_url = start_stub(config)
+    STUBS.append(server)
+
+    import main_unified as monitor
+    endpoints = {"BDTickets": "/v1/coaches/search", "BusBD": "/api/v2/searchlist"}
+    for provider in monitor.PROVIDERS:
+        provider.api_url = base_url + endpoints.get(provider.name, "/")
+
+    print(f"Stub latency {args.latency * 1000:.0f} ms, error rate {args.error_rate:.0%}, "
+          f"{args.coaches} coaches/response, {args.workers} workers/provider")
+    print(f"{'queries':>8} {'cycle':>6} {'seconds':>8} {'req/s':>8} {'peak MB':>8}")
+
+    devnull = open(os.devnull, "w")
+    for size in args.sizes:
+        queries = build_queries(monitor, size)
+        for label in ("cold", "warm"):
+            quiet = contextlib.nullcontext() if args.verbose else contextlib.redirect_stdout(devnull)
+            if label == "cold":
+                monitor.response_cache = monitor.ResponseCache()
+            elapsed, requests = timed_cycle(monitor, queries, quiet)
+            if label == "cold":
+                # Same starting point for the memory pass
+                monitor.response_cache = monitor.ResponseCache()
+            peak = traced_cycle(monitor, queries, quiet)
+            print(f"{size:>8} {label:>6} {elapsed:>8.3f} {requests / elapsed if elapsed else 0:>8.1f} "
+                  f"{peak / 1e6:>8.2f}")
+
+    with contextlib.redirect_stdout(devnull):
+        parse_times = measure_parse(monitor, build_queries(monitor, 4))
+    for name, (seconds, peak) in parse_times.items():
+        print(f"parse {name}: {seconds * 1e6:.1f} us/coach, peak {peak / 1e3:.1f} KB per response")
+
+    monitor.shutdown(timeout=5)
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
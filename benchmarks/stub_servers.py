@@ -0,0 +1,133 @@
+"""Local stand-ins for the BDTickets and BusBD search APIs.
+
+The stubs answer POST /v1/coaches/search and POST /api/v2/searchlist with
+payloads shaped like the real ones. Latency, error rate and coaches per
+response are configurable, so benchmarks run with no network.
+"""
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+COMPANIES = [
+    "National Travels", "Desh Travels", "Grameen Travels", "KTC Hanif", "Hanif Enterprise",
+    "Shyamoli N.R Travels", "Ena Transport", "Green Line", "Soudia", "Eagle Paribahan",
+]
+
+
+def bdtickets_payload(request, coaches, rng):
+    return {"data": [
+        {
+            "companyName": COMPANIES[i % len(COMPANIES)],
+            "coachNo": f"{request.get('identifier', '')}-{i}",
+            "availableSeats": rng.randint(0, 40),
+            "fare": 800 + (i % 5) * 50,
+            "departureTime": f"{6 + i % 18:02d}:{(i * 7) % 60:02d}",
+            "coachType": "AC" if i % 3 == 0 else "NON AC",
+            "boardingPoints": [{"name": f"Counter {j}", "time": "06:00"} for j in range(4)],
+        }
+        for i in range(coaches)
+    ]}
+
+
+def busbd_payload(request, coaches, rng):
+    return {"data": {"coaches": [
+        {
+            "company_name": COMPANIES[i % len(COMPANIES)],
+            "coach_no": f"{request.get('fromid')}-{request.get('toid')}-{i}",
+            "route_name": f"Route {request.get('fromid')}-{request.get('toid')}",
+            "available_seats": rng.randint(0, 40),
+            "fare": 800 + (i % 5) * 50,
+            "departure_time": f"{6 + i % 18:02d}:{(i * 7) % 60:02d}",
+            "coach_type": "AC" if i % 3 == 0 else "NON AC",
+            "boarding_points": [{"name": f"Counter {j}", "time": "06:00"} for j in range(4)],
+        }
+        for i in range(coaches)
+    ]}}
+
+
+PAYLOADS = {
+    "/v1/coaches/search": bdtickets_payload,
+    "/api/v2/searchlist": busbd_payload,
+}
+
+
+class StubConfig:
+    def __init__(self, latency=0.05, error_rate=0.0, coaches=20, seed=1):
+        self.latency = latency
+        self.error_rate = error_rate
+        self.coaches = coaches
+        self.rng = random.Random(seed)
+        self.requests = 0
+        self.lock = threading.Lock()
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def _reply(self, status, body=b""):
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_HEAD(self):
+        self._reply(405)
+
+    def do_POST(self):
+        config = self.server.config
+        length = int(self.headers.get("Content-Length") or 0)
+        raw = self.rfile.read(length) or b"{}"
+        request = json.loads(raw)
+        with config.lock:
+            config.requests += 1
+            fail = config.rng.random() < config.error_rate
+            # Same request, same payload, so repeated cycles see identical
+            # bodies like the real APIs mostly do
+            seed = raw.decode()
+
+        if config.latency:
+            time.sleep(config.latency)
+        build = PAYLOADS.get(self.path)
+        if build is None:
+            self._reply(404)
+        elif fail:
+            self._reply(503, b'{"message": "stub error"}')
+        else:
+            self._reply(200, json.dumps(build(request, config.coaches, random.Random(seed))).encode())
+
+
+class StubServer(ThreadingHTTPServer):
+    # The default backlog of 5 drops bursts of parallel connects (1 s SYN retry)
+    request_queue_size = 128
+    daemon_threads = True
+
+
+def start_stub(config, host="127.0.0.1", port=0):
+    """Start a stub server in a daemon thread; returns (server, base_url)"""
+    server = StubServer((host, port), StubHandler)
+    server.config = config
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://{host}:{server.server_address[1]}"
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Run a stub BDTickets/BusBD API")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--latency", type=float, default=0.05)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--coaches", type=int, default=20)
+    args = parser.parse_args()
+    server, url = start_stub(StubConfig(args.latency, args.error_rate, args.coaches), port=args.port)
+    print(f"Stub API on {url} (Ctrl+C to stop)")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
@@ -0,0 +1,158 @@
+"""Capture raw provider responses and replay them offline.
+
+With CAPTURE_DIR set, every query result of a sweep (response body, status
+and headers, or the error) is appended to a gzip-compressed JSONL file in
+that directory together with the query and a cycle id. Files rotate after
+CAPTURE_ROTATE_MB of uncompressed data; CAPTURE_KEEP_FILES limits how many
+are kept (0 = all).
+
+read_captures() streams records back one line at a time, so replaying weeks
+of captures needs only as much memory as the largest cycle.
+"""
+import glob
+import gzip
+import json
+import os
+import threading
+import time
+import zlib
+
+from dotenv import load_dotenv
+load_dotenv()
+
+from logger import log_message  # noqa: E402
+from providers import Query  # noqa: E402
+
+CAPTURE_DIR = os.getenv("CAPTURE_DIR", "")
+CAPTURE_ROTATE_MB = float(os.getenv("CAPTURE_ROTATE_MB", "64"))
+CAPTURE_KEEP_FILES = int(os.getenv("CAPTURE_KEEP_FILES", "0"))
+# Longest time a captured line may sit in the compressor before it is readable on disk
+CAPTURE_FLUSH_SECONDS = 5
+
+CAPTURE_PATTERN = "capture-*.jsonl.gz"
+
+
+class CaptureWriter:
+    """Appends capture records to the current archive file, rotating by size"""
+
+    def __init__(self, directory, rotate_bytes=CAPTURE_ROTATE_MB * 1024 * 1024, keep_files=CAPTURE_KEEP_FILES):
+        self.directory = directory
+        self.rotate_bytes = rotate_bytes
+        self.keep_files = keep_files
+        self.cycle = None
+        self._file = None
+        self._written = 0
+        self._last_flush = 0.0
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def start_cycle(self):
+        """Tag the records that follow as one sweep; replay diffs them together"""
+        self.cycle = f"{time.time():.6f}"
+
+    def record(self, query, response=None, error=None):
+        entry = {
+            "time": time.time(),
+            "cycle": self.cycle,
+            "provider": query.provider,
+            "journey": query.journey_type,
+            "date": query.travel_date,
+            "route": query.route,
+            "params": query.params,
+        }
+        if error is not None:
+            entry["error"] = str(error)
+        else:
+            entry["status"] = response.status_code
+            entry["headers"] = {name: response.headers[name] for name in ("ETag", "Last-Modified")
+                                if response.headers.get(name)}
+            entry["body"] = response.content.decode("utf-8", "replace")
+        line = (json.dumps(entry, ensure_ascii=False) + "\n").encode("utf-8")
+
+        with self._lock:
+            if self._file is None or self._written >= self.rotate_bytes:
+                self._rotate()
+            self._file.write(line)
+            self._written += len(line)
+            now = time.monotonic()
+            if now - self._last_flush >= CAPTURE_FLUSH_SECONDS:
+                self._file.flush(zlib.Z_SYNC_FLUSH)
+                self._last_flush = now
+
+    def _rotate(self):
+        if self._file is not None:
+            self._file.close()
+        # Names sort in time order; read_captures relies on that
+        while True:
+            now = time.time()
+            stamp = time.strftime("%Y%m%d-%H%M%S", time.localtime(now)) + f"-{int(now * 1000) % 1000:03d}"
+            path = os.path.join(self.directory, f"capture-{stamp}.jsonl.gz")
+            if not os.path.exists(path):
+                break
+            time.sleep(0.001)
+        self._file = gzip.open(path, "ab")
+        self._written = 0
+        self._last_flush = time.monotonic()
+        if self.keep_files:
+            for old in capture_files(self.directory)[:-self.keep_files]:
+                os.remove(old)
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+
+def capture_files(directory):
+    """Archive files in a capture directory, oldest first"""
+    return sorted(glob.glob(os.path.join(directory, CAPTURE_PATTERN)))
+
+
+def read_captures(paths):
+    """Yield capture records from files and/or capture directories, in order.
+
+    A file cut short (the process was killed before closing it) yields what
+    was flushed and stops there.
+    """
+    for path in paths:
+        files = capture_files(path) if os.path.isdir(path) else [path]
+        for name in files:
+            try:
+                with gzip.open(name, "rt", encoding="utf-8") as f:
+                    for line in f:
+                        if line.strip():
+                            yield json.loads(line)
+            except EOFError:
+                log_message(f"Capture {name} is truncated, replayed up to the cut")
+
+
+def query_from_record(record):
+    params = tuple(tuple(pair) for pair in record["params"])
+    return Query(record["provider"], record["journey"], record["date"], record["route"], params)
+
+
+class ReplayResponse:
+    """Enough of a requests.Response for the parse and fingerprint path"""
+
+    def __init__(self, record):
+        self.status_code = record["status"]
+        self.headers = record.get("headers") or {}
+        self.content = record["body"].encode("utf-8")
+
+    @property
+    def text(self):
+        return self.content.decode("utf-8")
+
+    def json(self):
+        return json.loads(self.content)
+
+
+_writer = None
+
+def get_writer():
+    """The process-wide CaptureWriter, or None when CAPTURE_DIR is unset"""
+    global _writer
+    if _writer is None and CAPTURE_DIR:
+        _writer = CaptureWriter(CAPTURE_DIR)
+    return _writer
@@ -0,0 +1,208 @@
+"""Command line entry point.
+
+    python cli.py run                  # resident monitor (same as main_unified.py)
+    python cli.py run --once           # one check cycle, then exit
+    python cli.py once                 # same as run --once, for cron / serverless timers
+    python cli.py check-config         # validate settings without contacting anything
+    python cli.py run --capture captures/
+    python cli.py replay captures/     # feed captured responses through parse/diff/notify offline
+    python cli.py daemon               # multi-user subscription daemon (see daemon.py)
+    python cli.py shard-server         # leases for sharded workers on several hosts (see sharding.py)
+    python cli.py history releases --company "National Travels" --route dhaka-to-rajshahi
+
+--providers and --sinks override ENABLED_PROVIDERS and NOTIFY_SINKS. The
+monitor is imported only after they are applied, and providers, sinks, the
+state store and thread pools are built on first use.
+"""
+import argparse
+import os
+import sys
+import time
+
+from dotenv import load_dotenv
+load_dotenv()
+
+
+def apply_overrides(args):
+    """Flags win over the environment; must run before main_unified is imported"""
+    if args.providers:
+        os.environ["ENABLED_PROVIDERS"] = args.providers
+    if args.sinks:
+        os.environ["NOTIFY_SINKS"] = args.sinks
+    if getattr(args, "capture", None):
+        os.environ["CAPTURE_DIR"] = args.capture
+
+
+def run(args):
+    import main_unified as monitor
+    if args.once:
+        monitor.run_once()
+    else:
+        monitor.main()
+    return 0
+
+
+def once(args):
+    args.once = True
+    return run(args)
+
+
+def replay(args):
+    # Replays are offline and fast: no capturing, no detail lookups, no
+    # coalescing wait, a throwaway state store and the file sink unless asked otherwise
+    os.environ["CAPTURE_DIR"] = ""
+    os.environ["DETAIL_LOOKUPS"] = "False"
+    os.environ["STATE_DB"] = args.state_db
+    os.environ.setdefault("NOTIFY_COALESCE_SECONDS", "0")
+    if not args.sinks:
+        os.environ["NOTIFY_SINKS"] = "file"
+    import main_unified as monitor
+    from logger import log_message
+    start = time.monotonic()
+    try:
+        cycles = monitor.replay_captures(args.paths)
+    finally:
+        monitor.shutdown()
+    log_message(f"Replayed {cycles} cycles in {time.monotonic() - start:.1f}s")
+    return 0
+
+
+def daemon(args):
+    if args.port is not None:
+        os.environ["DAEMON_PORT"] = str(args.port)
+    import daemon as subscription_daemon
+    subscription_daemon.main()
+    return 0
+
+
+def shard_server(args):
+    if args.port is not None:
+        os.environ["SHARD_SERVER_PORT"] = str(args.port)
+    import sharding
+    sharding.serve_shards()
+    return 0
+
+
+def history(args):
+    import history as availability_history
+    partitions = availability_history.open_partitions(args.dir)
+    if not partitions:
+        print(f"No history in {args.dir or '(HISTORY_DIR not set)'}")
+        return 1
+    if args.history_command == "stats":
+        availability_history.print_stats(partitions, args.dir)
+    elif args.history_command == "releases":
+        availability_history.print_releases(partitions, args.company, args.provider, args.route)
+    elif args.history_command == "timeline":
+        availability_history.print_timeline(partitions, args.route, args.date, args.company, args.provider)
+    else:
+        from release_windows import ReleaseWindows
+        windows = ReleaseWindows(args.min_events)
+        windows.learn(partitions)
+        print(f"Release windows: {sum(1 for _ in windows.describe())}")
+        for provider, route, company, slots, days in windows.describe():
+            print(f"  {provider} {route} {company}: {slots}"
+                  + (f" ({', '.join(map(str, days))} days before departure)" if days else ""))
+    return 0
+
+
+def check_config(args):
+    try:
+        import main_unified as monitor
+    except ValueError as e:
+        print(f"Invalid configuration: {e}")
+        return 1
+    from notifier import NOTIFY_SINKS, build_sinks
+    from providers import PROVIDERS as REGISTERED
+
+    problems = []
+    registered = {name.lower() for name in REGISTERED}
+    for name in monitor.ENABLED_PROVIDERS:
+        if name.strip() and name.strip().lower() not in registered:
+            problems.append(f"Unknown provider: {name.strip()} (known: {', '.join(REGISTERED)})")
+    if not monitor.PROVIDERS:
+        problems.append("No providers enabled")
+    if not monitor.TRAVEL_DATES and not monitor.RETURN_DATES:
+        problems.append("No dates to watch: set TRAVEL_DATE and/or RETURN_DATE")
+    try:
+        sinks = build_sinks(NOTIFY_SINKS)
+    except ValueError as e:
+        sinks = []
+        problems.append(str(e))
+    if not sinks:
+        problems.append("No notification sinks configured")
+    for sink in sinks:
+        problems.extend(f"{sink.name}: {problem}" for problem in sink.problems())
+
+    print(f"Providers: {', '.join(provider.name for provider in monitor.PROVIDERS) or '-'}")
+    print(f"Travel Dates: {', '.join(monitor.TRAVEL_DATES) or '-'}")
+    print(f"Return Dates: {', '.join(monitor.RETURN_DATES) or '-'}")
+    print(f"Queries per cycle: {len(monitor.build_watch_queries(monitor.PROVIDERS, monitor.get_journeys()))}")
+    print(f"Notification Sinks: {', '.join(sink.name for sink in sinks) or '-'}")
+    rules_path = monitor.watch_rules.path
+    print(f"Watch Rules: {rules_path if os.path.exists(rules_path) else 'default company list'}")
+    for problem in problems:
+        print(f"ERROR: {problem}")
+    print("Configuration OK" if not problems else f"{len(problems)} problem(s) found")
+    return 1 if problems else 0
+
+
+def build_parser():
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument("--providers", help="comma separated provider names (overrides ENABLED_PROVIDERS)")
+    common.add_argument("--sinks", help="comma separated notification sinks (overrides NOTIFY_SINKS)")
+
+    capturing = argparse.ArgumentParser(add_help=False)
+    capturing.add_argument("--capture", metavar="DIR", help="append raw responses to DIR (sets CAPTURE_DIR)")
+
+    monitoring = argparse.ArgumentParser(add_help=False, parents=[common, capturing])
+
+    parser = argparse.ArgumentParser(description="Bus ticket availability monitor")
+    commands = parser.add_subparsers(dest="command", required=True)
+    run_parser = commands.add_parser("run", parents=[monitoring], help="run the monitor")
+    run_parser.add_argument("--once", action="store_true", help="run one check cycle and exit")
+    run_parser.set_defaults(handler=run)
+    commands.add_parser("once", parents=[monitoring], help="run one check cycle and exit").set_defaults(handler=once)
+    replay_parser = commands.add_parser("replay", parents=[common],
+                                        help="replay captured responses through parse, diff and notify")
+    replay_parser.add_argument("paths", nargs="+", help="capture files or directories")
+    replay_parser.add_argument("--state-db", default=":memory:",
+                               help="state database to diff against (default: empty, in memory)")
+    replay_parser.set_defaults(handler=replay)
+    # Subscriptions pick the provider and sink, so the daemon takes no --providers/--sinks
+    daemon_parser = commands.add_parser("daemon", parents=[capturing],
+                                        help="serve subscriptions for several users from one process")
+    daemon_parser.add_argument("--port", type=int, help="subscription API port (overrides DAEMON_PORT)")
+    daemon_parser.set_defaults(handler=daemon, providers=None, sinks=None)
+    shard_parser = commands.add_parser("shard-server", help="serve leases and alert history to sharded workers")
+    shard_parser.add_argument("--port", type=int, help="shard server port (overrides SHARD_SERVER_PORT)")
+    shard_parser.set_defaults(handler=shard_server, providers=None, sinks=None)
+    history_parser = commands.add_parser("history", help="query the availability history (HISTORY_DIR)")
+    history_parser.add_argument("--dir", default=os.getenv("HISTORY_DIR", ""), help="history directory")
+    history_commands = history_parser.add_subparsers(dest="history_command", required=True)
+    history_commands.add_parser("stats", help="size and time span of the history")
+    releases_parser = history_commands.add_parser("releases", help="when seats usually get released")
+    timeline_parser = history_commands.add_parser("timeline", help="every availability change of one route and date")
+    timeline_parser.add_argument("--route", required=True)
+    timeline_parser.add_argument("--date", required=True, help="travel date (YYYY-MM-DD)")
+    windows_parser = history_commands.add_parser("windows", help="release windows burst polling would use")
+    windows_parser.add_argument("--min-events", type=int, default=int(os.getenv("RELEASE_MIN_EVENTS", "3")),
+                                help="releases a time slot needs to count")
+    releases_parser.add_argument("--route")
+    for sub in (releases_parser, timeline_parser):
+        sub.add_argument("--company")
+        sub.add_argument("--provider")
+    history_parser.set_defaults(handler=history, providers=None, sinks=None)
+    commands.add_parser("check-config", parents=[common],
+                        help="validate settings and exit").set_defaults(handler=check_config)
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    apply_overrides(args)
+    return args.handler(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,365 @@
+"""Multi-user subscription daemon.
+
+Subscriptions (provider, route, dates, companies, notification target) are
+managed through a small local HTTP API and kept in the state database.
+Every cycle the daemon collects the distinct (provider, route, date) queries
+of all subscriptions, polls each one once, and fans the parsed coaches out
+to every subscription that asked for them. Upstream load grows with the
+number of unique queries, not with the number of subscribers.
+
+    GET    /routes                 provider routes that can be subscribed to
+    GET    /subscriptions          list subscriptions
+    POST   /subscriptions          {"provider", "route", "dates", "companies"?, "notify": {"type", ...}}
+    DELETE /subscriptions/<id>     remove a subscription
+
+Set DAEMON_TOKEN to require "Authorization: Bearer <token>" on every call.
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from collections import namedtuple
+from datetime import date
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from dotenv import load_dotenv
+load_dotenv()
+
+import main_unified as monitor  # noqa: E402
+from diff import diff_coaches  # noqa: E402
+from logger import log_message  # noqa: E402
+from notifier import SINK_TYPES, Dispatcher  # noqa: E402
+from providers import PROVIDERS as REGISTERED_PROVIDERS  # noqa: E402
+from rules import DEFAULT_COMPANIES, compile_rules  # noqa: E402
+from state_store import STATE_DB, scoped_source  # noqa: E402
+from watchlist import parse_dates  # noqa: E402
+
+DAEMON_HOST = os.getenv("DAEMON_HOST", "127.0.0.1")
+DAEMON_PORT = int(os.getenv("DAEMON_PORT", "8765"))
+DAEMON_TOKEN = os.getenv("DAEMON_TOKEN", "")
+
+JOURNEYS = ("Onward", "Return")
+
+# Constructor arguments a subscriber may set for each sink type. No "file" sink:
+# a subscriber must not be able to make the daemon write to a path of its choosing
+SUBSCRIBER_SINK_FIELDS = {
+    "pushbullet": ("api_key",),
+    "webhook": ("url",),
+    "smtp": ("recipients",),
+}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS subscriptions (
+    id         TEXT PRIMARY KEY,
+    provider   TEXT NOT NULL,
+    route      TEXT NOT NULL,
+    dates      TEXT NOT NULL,
+    companies  TEXT NOT NULL,
+    notify     TEXT NOT NULL,
+    created_at REAL NOT NULL
+);
+"""
+
+Subscription = namedtuple("Subscription", ["id", "provider", "route", "dates", "companies", "notify"])
+
+
+# Shared polls keep every coach; each subscription filters for itself
+ALL_COACHES = compile_rules([{}])
+
+
+class SubscriptionStore:
+    def __init__(self, path=STATE_DB):
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.executescript(SCHEMA)
+
+    def add(self, subscription):
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO subscriptions (id, provider, route, dates, companies, notify, created_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (subscription.id, subscription.provider, subscription.route, ",".join(subscription.dates),
+                 json.dumps(sorted(subscription.companies)), json.dumps(subscription.notify), time.time()),
+            )
+
+    def remove(self, subscription_id):
+        with self._lock:
+            return self._conn.execute("DELETE FROM subscriptions WHERE id = ?", (subscription_id,)).rowcount > 0
+
+    def all(self):
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT id, provider, route, dates, companies, notify FROM subscriptions ORDER BY created_at"
+            ).fetchall()
+        return [Subscription(id, provider, route, dates.split(","), frozenset(json.loads(companies)),
+                             json.loads(notify))
+                for id, provider, route, dates, companies, notify in rows]
+
+
+def subscription_queries(subscription):
+    """The provider Query objects a subscription needs, one per date"""
+    provider = REGISTERED_PROVIDERS[subscription.provider]
+    return [query
+            for travel_date in subscription.dates
+            for journey_type in JOURNEYS
+            for query in provider.build_queries(travel_date, journey_type)
+            if query.route == subscription.route]
+
+
+def text_field(data, field, label=None):
+    """data[field] as a string ('' when missing or empty); ValueError for the client if it is another type"""
+    value = data.get(field)
+    if value is None or value == "":
+        return ""
+    if not isinstance(value, str):
+        raise ValueError(f"{label or field} must be a string")
+    return value
+
+
+def build_sink(notify):
+    sink_type = notify.get("type")
+    if not isinstance(sink_type, str) or sink_type not in SUBSCRIBER_SINK_FIELDS:
+        raise ValueError(f"notify.type must be one of: {', '.join(SUBSCRIBER_SINK_FIELDS)}")
+    kwargs = {field: text_field(notify, field, f"notify.{field}") for field in SUBSCRIBER_SINK_FIELDS[sink_type]}
+    return SINK_TYPES[sink_type](**{field: value for field, value in kwargs.items() if value})
+
+
+def parse_subscription(data):
+    """Validate a POSTed subscription; raises ValueError with a message for the client"""
+    if not isinstance(data, dict):
+        raise ValueError("expected a JSON object")
+    provider = REGISTERED_PROVIDERS.get(text_field(data, "provider"))
+    if provider is None:
+        raise ValueError(f"provider must be one of: {', '.join(REGISTERED_PROVIDERS)}")
+    dates = data.get("dates") or data.get("date")
+    if isinstance(dates, list) and all(isinstance(value, str) for value in dates):
+        dates = ",".join(dates)
+    elif dates is not None and not isinstance(dates, str):
+        raise ValueError("dates must be a string or a list of strings")
+    dates = parse_dates(dates)
+    if not dates:
+        raise ValueError("dates is required")
+    if dates[-1] < date.today().isoformat():
+        raise ValueError("all dates are in the past")
+    route = text_field(data, "route")
+    companies = data.get("companies") or DEFAULT_COMPANIES
+    if not isinstance(companies, list) or not all(isinstance(name, str) for name in companies):
+        raise ValueError("companies must be a list of names")
+    notify = data.get("notify")
+    if not isinstance(notify, dict):
+        raise ValueError("notify must be an object with a type")
+    problems = build_sink(notify).problems()
+    if problems:
+        raise ValueError("; ".join(problems))
+
+    subscription = Subscription(uuid.uuid4().hex[:12], provider.name, route, dates,
+                                frozenset(companies), notify)
+    if not subscription_queries(subscription):
+        routes = sorted({query.route for journey_type in JOURNEYS
+                         for query in provider.build_queries(dates[0], journey_type)})
+        raise ValueError(f"route must be one of: {', '.join(routes)}")
+    return subscription
+
+
+class SubscriptionDaemon:
+    """Polls the union of all subscriptions' queries and notifies each subscriber"""
+
+    def __init__(self, store):
+        self.store = store
+        self.wake = threading.Event()
+        self._dispatchers = {}
+        self._primed = set()
+
+    def dispatcher(self, subscription):
+        dispatcher = self._dispatchers.get(subscription.id)
+        if dispatcher is None:
+            dispatcher = self._dispatchers[subscription.id] = Dispatcher([build_sink(subscription.notify)])
+        return dispatcher
+
+    def run_cycle(self):
+        subscriptions = self.store.all()
+        self._drop_removed({subscription.id for subscription in subscriptions})
+        today = date.today().isoformat()
+
+        wanted = {}
+        unique = {}
+        for subscription in subscriptions:
+            queries = [query for query in subscription_queries(subscription) if query.travel_date >= today]
+            wanted[subscription.id] = queries
+            for query in queries:
+                unique.setdefault(query, REGISTERED_PROVIDERS[query.provider])
+        unique_queries = [(provider, query) for query, provider in unique.items()]
+        if not unique_queries:
+            return
+        log_message(f"Polling {len(unique_queries)} unique queries for {len(subscriptions)} subscriptions...")
+
+        results = {}
+        changed = set()
+        for (provider, query), result in zip(unique_queries, monitor.run_queries(unique_queries, ALL_COACHES)):
+            if result is None:
+                results[query] = monitor.response_cache.last_coaches(query)
+            else:
+                results[query], query_changed = result
+                if query_changed:
+                    changed.add(query)
+
+        for subscription in subscriptions:
+            queries = wanted[subscription.id]
+            if subscription.id in self._primed and not changed.intersection(queries):
+                continue
+            self._primed.add(subscription.id)
+            try:
+                self.notify_subscriber(subscription, queries, results)
+            except Exception as e:
+                log_message(f"Error notifying subscription {subscription.id}: {str(e)}", subscription.provider,
+                            level="error")
+
+    def notify_subscriber(self, subscription, queries, results):
+        state = monitor.get_state_store()
+        # Each subscriber has its own seen-coach history in the state store
+        source = scoped_source(subscription.provider, subscription.id)
+        companies = compile_rules([{"companies": sorted(subscription.companies)}])
+        by_journey = {}
+        unresolved = {}
+        for query in queries:
+            by_journey.setdefault(query.journey_type, [])
+            if results.get(query) is None:
+                # Never answered yet: leave this date's stored coaches alone
+                unresolved.setdefault(query.journey_type, set()).add(query.travel_date)
+                continue
+            by_journey[query.journey_type].extend(
+                coach for coach in results[query] if coach.company in companies)
+        for journey_type, coaches in by_journey.items():
+            previous = state.load_snapshots(source, journey_type, key_source=subscription.provider)
+            events = diff_coaches(previous, coaches)
+            if events:
+                monitor.send_notification(events, journey_type, subscription.provider, self.dispatcher(subscription))
+            state.sync(source, journey_type, coaches, keep_dates=unresolved.get(journey_type, ()))
+
+    def _drop_removed(self, live_ids):
+        for subscription_id in list(self._dispatchers):
+            if subscription_id not in live_ids:
+                self._dispatchers.pop(subscription_id).stop(timeout=10)
+        self._primed &= live_ids
+
+    def run_forever(self, interval_seconds):
+        while True:
+            cycle_start = time.monotonic()
+            try:
+                self.run_cycle()
+            except Exception as e:
+                log_message(f"Unexpected error in daemon cycle: {str(e)}", level="error")
+            # A new subscription wakes the loop so its first check isn't a full interval away
+            self.wake.wait(max(0, interval_seconds - (time.monotonic() - cycle_start)))
+            self.wake.clear()
+
+    def stop(self):
+        monitor.wait_for_alerts(timeout=30)
+        for dispatcher in self._dispatchers.values():
+            dispatcher.stop(timeout=30)
+        monitor.shutdown()
+
+
+class SubscriptionHandler(BaseHTTPRequestHandler):
+    service = None
+
+    def log_message(self, format, *args):
+        pass
+
+    def _reply(self, status, payload=None):
+        body = b"" if payload is None else json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _authorized(self):
+        if DAEMON_TOKEN and self.headers.get("Authorization") != f"Bearer {DAEMON_TOKEN}":
+            self._reply(401, {"error": "unauthorized"})
+            return False
+        return True
+
+    def do_GET(self):
+        if not self._authorized():
+            return
+        if self.path == "/subscriptions":
+            self._reply(200, [describe_subscription(s) for s in self.service.store.all()])
+        elif self.path == "/routes":
+            today = date.today().isoformat()
+            self._reply(200, {provider.name: sorted({query.route for journey_type in JOURNEYS
+                                                     for query in provider.build_queries(today, journey_type)})
+                              for provider in REGISTERED_PROVIDERS.values()})
+        else:
+            self._reply(404, {"error": "not found"})
+
+    def do_POST(self):
+        if not self._authorized():
+            return
+        if self.path != "/subscriptions":
+            self._reply(404, {"error": "not found"})
+            return
+        try:
+            length = int(self.headers.get("Content-Length") or 0)
+            subscription = parse_subscription(json.loads(self.rfile.read(length) or b"null"))
+        except ValueError as e:
+            self._reply(400, {"error": str(e)})
+            return
+        self.service.store.add(subscription)
+        log_message(f"Added subscription {subscription.id}: {subscription.route} "
+                    f"{', '.join(subscription.dates)}", subscription.provider)
+        self.service.wake.set()
+        self._reply(201, describe_subscription(subscription))
+
+    def do_DELETE(self):
+        if not self._authorized():
+            return
+        prefix = "/subscriptions/"
+        if not self.path.startswith(prefix):
+            self._reply(404, {"error": "not found"})
+        elif self.service.store.remove(self.path[len(prefix):]):
+            log_message(f"Removed subscription {self.path[len(prefix):]}")
+            self._reply(204)
+        else:
+            self._reply(404, {"error": "no such subscription"})
+
+
+def describe_subscription(subscription):
+    """JSON view of a subscription; secrets in the notify target are not echoed back"""
+    return {
+        "id": subscription.id,
+        "provider": subscription.provider,
+        "route": subscription.route,
+        "dates": subscription.dates,
+        "companies": sorted(subscription.companies),
+        "notify": {"type": subscription.notify.get("type")},
+    }
+
+
+def start_api(daemon, host=DAEMON_HOST, port=DAEMON_PORT):
+    """Serve the subscription API in a daemon thread"""
+    handler = type("BoundSubscriptionHandler", (SubscriptionHandler,), {"service": daemon})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="subscription-api", daemon=True).start()
+    return server
+
+
+def main():
+    daemon = SubscriptionDaemon(SubscriptionStore())
+    server = start_api(daemon)
+    log_message(f"Subscription daemon listening on http://{server.server_address[0]}:{server.server_address[1]}")
+    log_message(f"Check Interval: {monitor.CHECK_INTERVAL_MINUTES} minutes")
+    try:
+        daemon.run_forever(monitor.CHECK_INTERVAL_MINUTES * 60)
+    except KeyboardInterrupt:
+        log_message("Daemon stopped by user")
+    finally:
+        server.shutdown()
+        daemon.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+"""Lazy trip detail for the coaches an alert is about.
+
+Searches only say how many seats a coach has. With DETAIL_LOOKUPS=True the
+monitor asks the provider's detail endpoint (seat layout, departure and
+arrival, boarding points) for the coaches in an alert, and only for those:
+new or changed coaches are a handful per cycle, not the whole search result.
+Answers are kept in a TTL + LRU cache keyed by the coach and its seats and
+fare, so a coach is looked up again only once it changes or its entry expires.
+"""
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from dotenv import load_dotenv
+load_dotenv()
+
+from logger import log_message  # noqa: E402
+from metrics import DETAIL_LOOKUPS_DONE  # noqa: E402
+
+DETAIL_LOOKUPS = os.getenv("DETAIL_LOOKUPS", "False").lower() == "true"
+DETAIL_TTL_SECONDS = float(os.getenv("DETAIL_TTL_SECONDS", "600"))
+DETAIL_CACHE_SIZE = int(os.getenv("DETAIL_CACHE_SIZE", "2000"))
+# Most coaches looked up for one alert; the rest go out without detail
+DETAIL_MAX_PER_ALERT = int(os.getenv("DETAIL_MAX_PER_ALERT", "10"))
+# Free seat numbers listed in an alert line
+SEATS_LISTED = 8
+
+
+class DetailCache:
+    """Least recently used entries that also expire after ttl seconds"""
+
+    def __init__(self, ttl=DETAIL_TTL_SECONDS, size=DETAIL_CACHE_SIZE, clock=time.monotonic):
+        self.ttl = ttl
+        self.size = size
+        self.clock = clock
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key):
+        """(True, value) for a live entry, else (False, None)"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return False, None
+            stored_at, value = entry
+            if self.clock() - stored_at > self.ttl:
+                del self._entries[key]
+                return False, None
+            self._entries.move_to_end(key)
+            return True, value
+
+    def put(self, key, value):
+        with self._lock:
+            self._entries[key] = (self.clock(), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.size:
+                self._entries.popitem(last=False)
+
+
+def detail_key(coach):
+    # A change in seats or fare means the seat map changed too
+    return coach.key + (coach.seats, coach.fare)
+
+
+def supports_detail(provider, coach):
+    return bool(provider.detail_url) and coach.trip_id is not None and coach.seats != 0
+
+
+def get_detail(provider, coach, cache=None):
+    """The CoachDetail of a coach, from cache or one detail request; None when unavailable"""
+    if cache is None:
+        cache = get_cache()
+    key = detail_key(coach)
+    found, detail = cache.get(key)
+    if found:
+        DETAIL_LOOKUPS_DONE.inc(provider=provider.name, result="cached")
+        return detail
+    try:
+        detail = provider.fetch_detail(coach)
+    except Exception as e:
+        # Not cached: the next alert for this coach tries again
+        DETAIL_LOOKUPS_DONE.inc(provider=provider.name, result="error")
+        log_message(f"Detail lookup failed for {coach.company} {coach.coach_no}: {str(e)}", provider.name,
+                    level="warning")
+        return None
+    DETAIL_LOOKUPS_DONE.inc(provider=provider.name, result="fetched")
+    cache.put(key, detail)
+    return detail
+
+
+def describe_detail(detail):
+    """'Departs 08:30, arrives 14:15 | Boarding: Gabtoli, Kalyanpur | Free seats: A1 A2 B3 (+4) | Fares: 850/1200'"""
+    parts = []
+    times = []
+    if detail.departure_time:
+        times.append(f"Departs {detail.departure_time}")
+    if detail.arrival_time:
+        times.append(f"arrives {detail.arrival_time}")
+    if times:
+        parts.append(", ".join(times))
+    if detail.boarding:
+        parts.append(f"Boarding: {', '.join(detail.boarding)}")
+    if detail.seat_numbers is not None:
+        seats = " ".join(detail.seat_numbers[:SEATS_LISTED])
+        extra = len(detail.seat_numbers) - SEATS_LISTED
+        parts.append(f"Free seats: {seats or 'none'}" + (f" (+{extra})" if extra > 0 else ""))
+    if detail.fares:
+        parts.append(f"Fares: {'/'.join(f'{fare:g}' for fare in detail.fares)}")
+    return " | ".join(parts)
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+def get_cache():
+    """The process-wide DetailCache"""
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = DetailCache()
+    return _cache
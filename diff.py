@@ -0,0 +1,73 @@
+import os
+from collections import namedtuple
+
+from dotenv import load_dotenv
+load_dotenv()
+
+# Alert when a coach's free seats drop below this many (0 disables)
+LOW_SEATS_THRESHOLD = int(os.getenv("LOW_SEATS_THRESHOLD", "0"))
+NOTIFY_FARE_CHANGES = os.getenv("NOTIFY_FARE_CHANGES", "True").lower() == "true"
+
+NEW_COACH = "new"
+SEATS_REOPENED = "reopened"
+SEATS_LOW = "low_seats"
+FARE_CHANGED = "fare_changed"
+
+EVENT_LABELS = {
+    NEW_COACH: "New",
+    SEATS_REOPENED: "Seats back",
+    SEATS_LOW: "Few seats left",
+    FARE_CHANGED: "Fare changed",
+}
+
+# What we remember about a coach between checks
+Snapshot = namedtuple("Snapshot", ["seats", "fare", "present"])
+
+# One thing worth telling the user about; previous is the Snapshot before (None for new coaches)
+Event = namedtuple("Event", ["kind", "coach", "previous"])
+
+
+def diff_coaches(previous, coaches, low_seats=LOW_SEATS_THRESHOLD, fare_changes=NOTIFY_FARE_CHANGES):
+    """Compare current coaches with the previous {coach.key: Snapshot} and return Events.
+
+    - new: key never seen before (and not sold out)
+    - reopened: coach was gone or at 0 seats and now has seats
+    - low_seats: seats fell below the threshold since last check
+    - fare_changed: both fares known and different (ignored while sold out)
+    """
+    current = {coach.key: coach for coach in coaches}
+    events = []
+
+    for key in current.keys() - previous.keys():
+        coach = current[key]
+        if coach.seats != 0:
+            events.append(Event(NEW_COACH, coach, None))
+
+    for key in current.keys() & previous.keys():
+        coach = current[key]
+        before = previous[key]
+        if coach.seats != 0 and (not before.present or before.seats == 0):
+            events.append(Event(SEATS_REOPENED, coach, before))
+            continue
+        if coach.seats == 0:
+            # Sold out: nothing to act on until seats come back
+            continue
+        if (low_seats and coach.seats is not None and 0 < coach.seats < low_seats
+                and (before.seats is None or before.seats >= low_seats)):
+            events.append(Event(SEATS_LOW, coach, before))
+        if (fare_changes and coach.fare is not None and before.fare is not None
+                and coach.fare != before.fare):
+            events.append(Event(FARE_CHANGED, coach, before))
+
+    return events
+
+
+def describe_event(event):
+    """One notification line for an event"""
+    coach = event.coach
+    line = f"{EVENT_LABELS[event.kind]}: {coach.company} {coach.display_no} on {coach.travel_date} ({coach.route})"
+    if event.kind == FARE_CHANGED:
+        line += f" fare {event.previous.fare:g} -> {coach.fare:g}"
+    elif coach.seats is not None:
+        line += f" seats {coach.seats}"
+    return line
@@ -0,0 +1,78 @@
+import hashlib
+import threading
+
+# Per-query fingerprint of the last response we parsed, so an identical
+# response can skip parsing, filtering and diffing altogether
+
+
+class Fingerprint:
+    __slots__ = ("digest", "etag", "last_modified", "coaches")
+
+    def __init__(self, digest, etag, last_modified, coaches):
+        self.digest = digest
+        self.etag = etag
+        self.last_modified = last_modified
+        self.coaches = coaches
+
+
+def body_digest(content):
+    return hashlib.blake2b(content, digest_size=16).digest()
+
+
+class ResponseCache:
+    """Remembers the last response fingerprint and parsed coaches of every query"""
+
+    def __init__(self):
+        self._fingerprints = {}
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "not_modified": 0, "misses": 0}
+
+    def _count(self, name):
+        with self._lock:
+            self.stats[name] += 1
+
+    def conditional_headers(self, key):
+        """If-None-Match / If-Modified-Since headers for key, when the API sent validators"""
+        fingerprint = self._fingerprints.get(key)
+        headers = {}
+        if fingerprint:
+            if fingerprint.etag:
+                headers["If-None-Match"] = fingerprint.etag
+            if fingerprint.last_modified:
+                headers["If-Modified-Since"] = fingerprint.last_modified
+        return headers
+
+    def lookup(self, key, response):
+        """Return the cached coaches if response matches the last one for key, else None"""
+        fingerprint = self._fingerprints.get(key)
+        if fingerprint is None:
+            self._count("misses")
+            return None
+        if response.status_code == 304:
+            self._count("not_modified")
+            return fingerprint.coaches
+        if body_digest(response.content) == fingerprint.digest:
+            self._count("hits")
+            return fingerprint.coaches
+        self._count("misses")
+        return None
+
+    def store(self, key, response, coaches):
+        self._fingerprints[key] = Fingerprint(
+            body_digest(response.content),
+            response.headers.get("ETag"),
+            response.headers.get("Last-Modified"),
+            coaches,
+        )
+
+    def clear(self):
+        """Forget every fingerprint, so the next response of each query is parsed again"""
+        self._fingerprints = {}
+
+    def last_coaches(self, key):
+        fingerprint = self._fingerprints.get(key)
+        return fingerprint.coaches if fingerprint else None
+
+    def skipped(self):
+        """How many responses skipped parsing in total"""
+        return self.stats["hits"] + self.stats["not_modified"]
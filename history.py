@@ -0,0 +1,334 @@
+"""Append-only availability history.
+
+With HISTORY_DIR set, every parsed search response (one that differed from
+the previous response for its query) is appended as rows of fixed-width
+columns, one file per column:
+
+    time.u32   observation time (epoch seconds)
+    query.u32  query id   (queries.tsv: id, provider, journey, date, route)
+    coach.u32  coach id   (coaches.tsv: id, provider, route, date, coach_no, company)
+    seats.i16  free seats (-1 unknown)
+    fare.f32   fare       (NaN unknown)
+
+Each response starts with a marker row (coach id 0), so a coach missing
+from a later response of its query can be told apart from one that was
+never polled. Readers memory-map the columns and scan them in place, so
+months of history are queried without loading them into memory.
+
+Each writer process owns one partition directory (the worker id when
+sharding); readers combine every partition under HISTORY_DIR.
+"""
+import math
+import mmap
+import os
+import threading
+import time
+from array import array
+from datetime import date, datetime
+
+from dotenv import load_dotenv
+load_dotenv()
+
+from sharding import SHARDING, WORKER_ID  # noqa: E402
+
+HISTORY_DIR = os.getenv("HISTORY_DIR", "")
+# Rows kept in memory before they are appended to the column files
+HISTORY_FLUSH_ROWS = 5000
+
+COLUMNS = (("time", "I"), ("query", "I"), ("coach", "I"), ("seats", "h"), ("fare", "f"))
+COLUMN_FILES = {name: f"{name}.{ {'I': 'u32', 'h': 'i16', 'f': 'f32'}[typecode]}" for name, typecode in COLUMNS}
+MARKER = 0
+UNKNOWN_SEATS = -1
+
+for _name, _typecode in COLUMNS:
+    # The on-disk format relies on these widths
+    assert array(_typecode).itemsize == {"I": 4, "h": 2, "f": 4}[_typecode]
+
+
+def _load_dictionary(path):
+    entries = {}
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                fields = line.rstrip("\n").split("\t")
+                entries[int(fields[0])] = tuple(fields[1:])
+    except FileNotFoundError:
+        pass
+    return entries
+
+
+class HistoryWriter:
+    """Buffers observations and appends them to this process's partition"""
+
+    def __init__(self, directory, partition=None):
+        self.path = os.path.join(directory, partition or (WORKER_ID if SHARDING else "main"))
+        os.makedirs(self.path, exist_ok=True)
+        self._align_columns()
+        self._lock = threading.Lock()
+        self._query_ids = {key: id for id, key in _load_dictionary(os.path.join(self.path, "queries.tsv")).items()}
+        self._coach_ids = {key[:4]: id for id, key in _load_dictionary(os.path.join(self.path, "coaches.tsv")).items()}
+        self._new_queries = []
+        self._new_coaches = []
+        self._buffers = {name: array(typecode) for name, typecode in COLUMNS}
+
+    def _align_columns(self):
+        """Cut every column file back to the rows all of them have.
+
+        A crash between column appends leaves some columns longer; appending
+        after their own ends would misalign every later row.
+        """
+        sizes = {}
+        for name, typecode in COLUMNS:
+            try:
+                sizes[name] = os.path.getsize(os.path.join(self.path, COLUMN_FILES[name])) // array(typecode).itemsize
+            except FileNotFoundError:
+                sizes[name] = 0
+        rows = min(sizes.values())
+        for name, typecode in COLUMNS:
+            path = os.path.join(self.path, COLUMN_FILES[name])
+            # Also drops a partly written last value
+            if os.path.exists(path) and os.path.getsize(path) != rows * array(typecode).itemsize:
+                os.truncate(path, rows * array(typecode).itemsize)
+
+    def _query_id(self, query):
+        key = (query.provider, query.journey_type, query.travel_date, query.route)
+        query_id = self._query_ids.get(key)
+        if query_id is None:
+            query_id = self._query_ids[key] = len(self._query_ids) + 1
+            self._new_queries.append((query_id,) + key)
+        return query_id
+
+    def _coach_id(self, coach):
+        key = (coach.source, coach.route, coach.travel_date, coach.coach_no)
+        coach_id = self._coach_ids.get(key)
+        if coach_id is None:
+            coach_id = self._coach_ids[key] = len(self._coach_ids) + 1
+            self._new_coaches.append((coach_id,) + key + (coach.company,))
+        return coach_id
+
+    def record(self, query, coaches, now=None):
+        """Append one parsed response: a marker row, then one row per coach"""
+        now = int(time.time() if now is None else now)
+        with self._lock:
+            buffers = self._buffers
+            query_id = self._query_id(query)
+            buffers["time"].append(now)
+            buffers["query"].append(query_id)
+            buffers["coach"].append(MARKER)
+            buffers["seats"].append(UNKNOWN_SEATS)
+            buffers["fare"].append(math.nan)
+            for coach in coaches:
+                buffers["time"].append(now)
+                buffers["query"].append(query_id)
+                buffers["coach"].append(self._coach_id(coach))
+                buffers["seats"].append(UNKNOWN_SEATS if coach.seats is None else max(-1, min(coach.seats, 32767)))
+                buffers["fare"].append(math.nan if coach.fare is None else coach.fare)
+            full = len(buffers["time"]) >= HISTORY_FLUSH_ROWS
+        if full:
+            self.flush()
+
+    def flush(self):
+        with self._lock:
+            if not len(self._buffers["time"]):
+                return
+            # Dictionaries first: a row must never point at an id that isn't on disk
+            self._append_lines("queries.tsv", self._new_queries)
+            self._append_lines("coaches.tsv", self._new_coaches)
+            self._new_queries, self._new_coaches = [], []
+            for name, typecode in COLUMNS:
+                with open(os.path.join(self.path, COLUMN_FILES[name]), "ab") as f:
+                    self._buffers[name].tofile(f)
+                self._buffers[name] = array(typecode)
+
+    def _append_lines(self, filename, rows):
+        if rows:
+            with open(os.path.join(self.path, filename), "a", encoding="utf-8") as f:
+                f.writelines("\t".join(str(field) for field in row) + "\n" for row in rows)
+
+
+class Partition:
+    """One writer's columns, memory-mapped read-only"""
+
+    def __init__(self, path):
+        self.path = path
+        self.queries = _load_dictionary(os.path.join(path, "queries.tsv"))
+        self.coaches = _load_dictionary(os.path.join(path, "coaches.tsv"))
+        self._maps = []
+        self.columns = {}
+        for name, typecode in COLUMNS:
+            self.columns[name] = self._map(os.path.join(path, COLUMN_FILES[name]), typecode)
+        # A crash between column appends can leave some columns a few rows longer
+        self.rows = min(len(column) for column in self.columns.values())
+
+    def _map(self, filename, typecode):
+        try:
+            with open(filename, "rb") as f:
+                if os.fstat(f.fileno()).st_size == 0:
+                    return memoryview(b"").cast(typecode)
+                mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except FileNotFoundError:
+            return memoryview(b"").cast(typecode)
+        self._maps.append(mapped)
+        view = memoryview(mapped)
+        usable = len(view) - len(view) % array(typecode).itemsize
+        return view[:usable].cast(typecode)
+
+    def scan(self, query_ids=None):
+        """Yield (time, query id, coach id, seats, fare) rows, optionally only for some queries"""
+        columns = self.columns
+        rows = zip(columns["time"], columns["query"], columns["coach"], columns["seats"], columns["fare"])
+        for index, row in enumerate(rows):
+            if index >= self.rows:
+                return
+            if query_ids is None or row[1] in query_ids:
+                yield row
+
+
+def open_partitions(directory=HISTORY_DIR):
+    if not directory or not os.path.isdir(directory):
+        return []
+    return [Partition(os.path.join(directory, name)) for name in sorted(os.listdir(directory))
+            if os.path.isdir(os.path.join(directory, name))]
+
+
+def coach_changes(partition, query_ids):
+    """Yield (time, kind, query id, coach id, seats, fare) availability changes for some queries.
+
+    kind is 'released' (seats appeared: new coach, back from sold out or back
+    after being missing), 'sold_out', 'gone' or 'fare'.
+    """
+    previous = {}      # query id -> coach ids in the last complete response
+    current = {}       # query id -> (time, coach ids) of the response being read
+    last = {}          # coach id -> (seats, fare)
+
+    def finish(query_id):
+        # Coaches of the previous response that the finished one no longer lists
+        if query_id in current:
+            when, seen = current[query_id]
+            for gone in previous.get(query_id, set()) - seen:
+                yield when, "gone", query_id, gone, None, None
+            previous[query_id] = seen
+
+    for when, query_id, coach_id, seats, fare in partition.scan(query_ids):
+        if coach_id == MARKER:
+            yield from finish(query_id)
+            current[query_id] = (when, set())
+            continue
+        current.setdefault(query_id, (when, set()))[1].add(coach_id)
+        was_present = coach_id in previous.get(query_id, ())
+        before_seats, before_fare = last.get(coach_id, (None, None))
+        last[coach_id] = (seats, fare)
+        if query_id not in previous:
+            # The first response of a query is the starting point, not a change
+            continue
+        if seats != 0 and (not was_present or before_seats == 0):
+            yield when, "released", query_id, coach_id, seats, fare
+        elif seats == 0 and was_present and before_seats != 0:
+            yield when, "sold_out", query_id, coach_id, seats, fare
+        elif was_present and not math.isnan(fare) and before_fare is not None and not math.isnan(before_fare) \
+                and fare != before_fare:
+            yield when, "fare", query_id, coach_id, seats, fare
+    for query_id in list(current):
+        yield from finish(query_id)
+
+
+def matching_queries(partition, provider=None, route=None, travel_date=None):
+    return {query_id for query_id, (query_provider, _, query_date, query_route) in partition.queries.items()
+            if (provider is None or query_provider.lower() == provider.lower())
+            and (route is None or query_route == route)
+            and (travel_date is None or query_date == travel_date)}
+
+
+def releases(partitions, provider=None, route=None):
+    """Yield (time, provider, route, travel date, company) for every seat release.
+
+    The route is the watched (query) route, which is what the monitor polls.
+    """
+    for partition in partitions:
+        query_ids = matching_queries(partition, provider, route)
+        for when, kind, query_id, coach_id, _, _ in coach_changes(partition, query_ids):
+            if kind == "released":
+                query_provider, _, travel_date, query_route = partition.queries[query_id]
+                yield when, query_provider, query_route, travel_date, partition.coaches[coach_id][4]
+
+
+def release_profile(partitions, company=None, provider=None, route=None):
+    """Counts of seat releases by hour of day and by days before departure"""
+    from rules import normalize_name
+    wanted_company = normalize_name(company) if company else None
+    by_hour = [0] * 24
+    by_days_before = {}
+    for when, _, _, travel_date, coach_company in releases(partitions, provider, route):
+        if wanted_company and normalize_name(coach_company) != wanted_company:
+            continue
+        released = datetime.fromtimestamp(when)
+        by_hour[released.hour] += 1
+        days = (date.fromisoformat(travel_date) - released.date()).days
+        by_days_before[days] = by_days_before.get(days, 0) + 1
+    return by_hour, by_days_before
+
+
+def _bar(count, peak, width=40):
+    return "#" * (round(count / peak * width) if peak else 0)
+
+
+def print_releases(partitions, company=None, provider=None, route=None):
+    by_hour, by_days_before = release_profile(partitions, company, provider, route)
+    total = sum(by_hour)
+    label = " ".join(part for part in (company, provider, route) if part) or "all coaches"
+    print(f"Seat releases for {label}: {total}")
+    if not total:
+        return
+    print("\nBy hour of day:")
+    peak = max(by_hour)
+    for hour, count in enumerate(by_hour):
+        if count:
+            print(f"  {hour:02d}:00  {count:>6}  {_bar(count, peak)}")
+    print("\nBy days before departure:")
+    peak = max(by_days_before.values())
+    for days in sorted(by_days_before, reverse=True):
+        print(f"  {days:>4}d  {by_days_before[days]:>6}  {_bar(by_days_before[days], peak)}")
+
+
+def print_timeline(partitions, route, travel_date, company=None, provider=None):
+    from rules import normalize_name
+    wanted_company = normalize_name(company) if company else None
+    for partition in partitions:
+        query_ids = matching_queries(partition, provider, route, travel_date)
+        for when, kind, _, coach_id, seats, fare in coach_changes(partition, query_ids):
+            source, _, _, coach_no, coach_company = partition.coaches[coach_id]
+            if wanted_company and normalize_name(coach_company) != wanted_company:
+                continue
+            detail = ""
+            if kind in ("released", "fare"):
+                detail = f" seats {seats if seats >= 0 else '?'}" + ("" if math.isnan(fare) else f" fare {fare:g}")
+            print(f"{datetime.fromtimestamp(when):%Y-%m-%d %H:%M}  {kind:<9} {source} {coach_company} "
+                  f"{coach_no}{detail}")
+
+
+def print_stats(partitions, directory=HISTORY_DIR):
+    rows = sum(partition.rows for partition in partitions)
+    size = sum(os.path.getsize(os.path.join(partition.path, name))
+               for partition in partitions for name in os.listdir(partition.path))
+    print(f"History: {directory} ({len(partitions)} partitions, {size / 1e6:.1f} MB)")
+    print(f"Rows: {rows}")
+    print(f"Queries: {sum(len(partition.queries) for partition in partitions)}, "
+          f"coaches: {sum(len(partition.coaches) for partition in partitions)}")
+    filled = [partition for partition in partitions if partition.rows]
+    if filled:
+        first = min(partition.columns["time"][0] for partition in filled)
+        last = max(partition.columns["time"][partition.rows - 1] for partition in filled)
+        print(f"From {datetime.fromtimestamp(first):%Y-%m-%d %H:%M} to {datetime.fromtimestamp(last):%Y-%m-%d %H:%M}")
+
+
+_writer = None
+_writer_lock = threading.Lock()
+
+def get_writer():
+    """The process-wide HistoryWriter, or None when HISTORY_DIR is unset"""
+    global _writer
+    if _writer is None and HISTORY_DIR:
+        with _writer_lock:
+            if _writer is None:
+                _writer = HistoryWriter(HISTORY_DIR)
+    return _writer
@@ -0,0 +1,94 @@
+import os
+import threading
+import time
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from dotenv import load_dotenv
+load_dotenv()
+
+# Connect timeout is kept short so a dead host fails fast; read timeout is the
+# longest we wait for a search response before giving up on that route
+HTTP_CONNECT_TIMEOUT = float(os.getenv("HTTP_CONNECT_TIMEOUT", "5"))
+HTTP_READ_TIMEOUT = float(os.getenv("HTTP_READ_TIMEOUT", "20"))
+HTTP_POOL_SIZE = int(os.getenv("HTTP_POOL_SIZE", "8"))
+
+# Seconds before each scheduled check to open connections (0 disables warming)
+WARM_CONNECTIONS_SECONDS = int(os.getenv("WARM_CONNECTIONS_SECONDS", "0"))
+
+DEFAULT_HEADERS = {"Content-Type": "application/json"}
+
+_sessions = {}
+_sessions_lock = threading.Lock()
+
+def get_timeout():
+    return (HTTP_CONNECT_TIMEOUT, HTTP_READ_TIMEOUT)
+
+def get_session(provider, pool_size=None):
+    """Return the shared keep-alive Session for a provider, creating it on first use"""
+    session = _sessions.get(provider)
+    if session is not None:
+        return session
+
+    with _sessions_lock:
+        session = _sessions.get(provider)
+        if session is None:
+            size = max(1, pool_size or HTTP_POOL_SIZE)
+            session = requests.Session()
+            session.headers.update(DEFAULT_HEADERS)
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=size)
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            _sessions[provider] = session
+    return session
+
+def post_json(provider, url, payload, **kwargs):
+    """POST a JSON payload over the provider's pooled session with connect/read timeouts"""
+    kwargs.setdefault("timeout", get_timeout())
+    return get_session(provider).post(url, json=payload, **kwargs)
+
+def warm_connection(provider, url):
+    """Open (or refresh) a pooled connection to url's host so the next request skips the handshake"""
+    parts = urlsplit(url)
+    base_url = f"{parts.scheme}://{parts.netloc}/"
+    try:
+        # Any response, even 404/405, means TCP+TLS is established and pooled
+        get_session(provider).head(base_url, timeout=get_timeout(), allow_redirects=False)
+        return True
+    except requests.RequestException:
+        return False
+
+def warm_connections(provider, url, count=1):
+    """Warm `count` pooled connections at once (one per request we expect to run in parallel)"""
+    if count <= 1:
+        return warm_connection(provider, url)
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(warm_connection(provider, url)))
+               for _ in range(count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return any(results)
+
+def sleep_until_next_check(interval_seconds, warm_targets, sleep=None):
+    """Sleep for interval_seconds, warming (provider, url, count) targets shortly before waking"""
+    sleep = sleep or time.sleep
+    lead = min(WARM_CONNECTIONS_SECONDS, interval_seconds)
+    if lead <= 0 or not warm_targets:
+        sleep(interval_seconds)
+        return
+
+    sleep(interval_seconds - lead)
+    for provider, url, count in warm_targets:
+        warm_connections(provider, url, count)
+    sleep(lead)
+
+def close_sessions():
+    with _sessions_lock:
+        for session in _sessions.values():
+            session.close()
+        _sessions.clear()
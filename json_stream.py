@@ -0,0 +1,88 @@
+"""Decode the records of one list inside a JSON document, one at a time.
+
+json.loads() turns a whole search response into Python objects before the
+provider looks at a single coach. iter_array() walks the raw text to the
+list at a key path (e.g. ("data", "coaches")) and decodes its elements one
+by one with the C decoder, so only the current record is alive at a time and
+sibling fields outside the path are skipped over rather than kept.
+
+Each element is decoded whole, including fields the caller never reads and
+records it then throws away: skipping unwanted values in Python instead of
+letting the C decoder build them made parsing about twice as slow, and the
+peak memory is the decoded text either way.
+"""
+import json
+import re
+from json.decoder import scanstring
+
+_decoder = json.JSONDecoder()
+_WHITESPACE = re.compile(r"[ \t\n\r]*")
+
+
+def _skip_whitespace(text, index):
+    return _WHITESPACE.match(text, index).end()
+
+
+def _expect(text, index, char):
+    index = _skip_whitespace(text, index)
+    if text[index:index + 1] != char:
+        raise json.JSONDecodeError(f"Expecting '{char}'", text, index)
+    return index + 1
+
+
+def _after_value(text, index, closing):
+    """Index after the ',' that follows a value, or None at the container's closing bracket"""
+    index = _skip_whitespace(text, index)
+    char = text[index:index + 1]
+    if char == ",":
+        return _skip_whitespace(text, index + 1)
+    if char == closing:
+        return None
+    raise json.JSONDecodeError("Expecting ',' delimiter", text, index)
+
+
+def find_value(text, path, index=0):
+    """Start index of the value at path (a sequence of object keys), or None if a key is missing.
+
+    A key whose parent is not an object (null, "", [] ...) counts as missing.
+    """
+    for key in path:
+        index = _skip_whitespace(text, index)
+        if text[index:index + 1] != "{":
+            # Still has to be valid JSON
+            _decoder.raw_decode(text, index)
+            return None
+        index = _skip_whitespace(text, index + 1)
+        if text.startswith("}", index):
+            return None
+        while True:
+            if text[index:index + 1] != '"':
+                raise json.JSONDecodeError("Expecting property name enclosed in double quotes", text, index)
+            name, index = scanstring(text, index + 1)
+            index = _skip_whitespace(text, _expect(text, index, ":"))
+            if name == key:
+                break
+            _, index = _decoder.raw_decode(text, index)
+            index = _after_value(text, index, "}")
+            if index is None:
+                return None
+    return _skip_whitespace(text, index)
+
+
+def iter_array(text, path):
+    """Yield the decoded elements of the list at path; nothing if the path is missing, null or empty"""
+    index = find_value(text, path)
+    if index is None:
+        return
+    if text[index:index + 1] != "[":
+        value, _ = _decoder.raw_decode(text, index)
+        if value:
+            raise ValueError(f"expected a list at {'.'.join(path)}, got {type(value).__name__}")
+        return
+    index = _skip_whitespace(text, index + 1)
+    if text.startswith("]", index):
+        return
+    while index is not None:
+        item, index = _decoder.raw_decode(text, index)
+        yield item
+        index = _after_value(text, index, "]")
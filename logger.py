@@ -0,0 +1,110 @@
+"""Leveled logging for the monitor.
+
+log_message() hands a record to a queue and returns; a listener thread does
+the formatting and writing, so a slow stdout never holds up a check. Set
+LOG_FORMAT=json for one JSON object per line with level, source and any extra
+fields (date, route, ...). Routine per-query lines can be sampled with
+LOG_ROUTINE_SAMPLE (1 = keep all, 0.1 = keep about one in ten, 0 = drop).
+"""
+import atexit
+import json
+import logging
+import os
+import queue
+import random
+import sys
+import time
+from logging.handlers import QueueHandler, QueueListener
+
+from dotenv import load_dotenv
+load_dotenv()
+
+LOG_FORMAT = os.getenv("LOG_FORMAT", "text").lower()
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_ROUTINE_SAMPLE = float(os.getenv("LOG_ROUTINE_SAMPLE", "1"))
+
+LEVELS = {
+    "debug": logging.DEBUG,
+    "info": logging.INFO,
+    "warning": logging.WARNING,
+    "warn": logging.WARNING,
+    "error": logging.ERROR,
+    "critical": logging.CRITICAL,
+}
+
+
+class TextFormatter(logging.Formatter):
+    """[timestamp] [source] message, the monitor's original line format"""
+
+    def format(self, record):
+        timestamp = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(record.created))
+        source_prefix = f"[{record.source}] " if record.source else ""
+        return f"[{timestamp}] {source_prefix}{record.getMessage()}"
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(record.created)) + f".{int(record.msecs):03d}",
+            "level": record.levelname.lower(),
+            "message": record.getMessage(),
+        }
+        if record.source:
+            entry["source"] = record.source
+        entry.update(record.fields)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class _StdoutHandler(logging.StreamHandler):
+    """Writes to whatever sys.stdout is at emit time"""
+
+    @property
+    def stream(self):
+        return sys.stdout
+
+    @stream.setter
+    def stream(self, value):
+        pass
+
+
+class _PassThroughQueueHandler(QueueHandler):
+    # The default prepare() formats in the caller's thread; leave that to the listener
+    def prepare(self, record):
+        return record
+
+
+def _setup():
+    handler = _StdoutHandler()
+    handler.setFormatter(JsonFormatter() if LOG_FORMAT == "json" else TextFormatter())
+    log_queue = queue.SimpleQueue()
+    listener = QueueListener(log_queue, handler)
+    listener.start()
+    atexit.register(listener.stop)
+
+    logger = logging.getLogger("ticket_monitor")
+    logger.setLevel(LEVELS.get(LOG_LEVEL.lower(), logging.INFO))
+    logger.propagate = False
+    logger.addHandler(_PassThroughQueueHandler(log_queue))
+    if LOG_LEVEL.lower() not in LEVELS:
+        logger.warning(f"Unknown LOG_LEVEL {LOG_LEVEL!r} (expected one of {', '.join(sorted(LEVELS))}), using INFO",
+                       extra={"source": None, "fields": {}})
+    return logger, listener
+
+
+_logger, _listener = _setup()
+
+
+def log_message(message, source=None, level="info", routine=False, **fields):
+    """Log one line. routine=True marks high-volume per-query lines subject to LOG_ROUTINE_SAMPLE."""
+    levelno = LEVELS.get(level, logging.INFO)
+    if not _logger.isEnabledFor(levelno):
+        return
+    if routine and LOG_ROUTINE_SAMPLE < 1 and random.random() >= LOG_ROUTINE_SAMPLE:
+        return
+    _logger.log(levelno, message, extra={"source": source, "fields": fields})
+
+
+def log_separator():
+    """A ==== rule between cycles in text logs; skipped in JSON logs"""
+    if LOG_FORMAT != "json":
+        log_message("=" * 60)
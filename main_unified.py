@@ -1,283 +1,680 @@
-import requests
-import time
 import os
-from datetime import datetime
-import json
-from pushbullet import Pushbullet
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
 
 load_dotenv()
 
+from capture import CAPTURE_DIR, ReplayResponse, get_writer, query_from_record, read_captures  # noqa: E402
+from details import DETAIL_LOOKUPS, DETAIL_MAX_PER_ALERT, describe_detail, get_detail, supports_detail  # noqa: E402
+from diff import NEW_COACH, SEATS_REOPENED, describe_event, diff_coaches  # noqa: E402
+from fingerprints import ResponseCache  # noqa: E402
+from history import HISTORY_DIR, get_writer as get_history  # noqa: E402
+from http_pool import HTTP_CONNECT_TIMEOUT, HTTP_READ_TIMEOUT, get_session, sleep_until_next_check  # noqa: E402
+from logger import log_message, log_separator  # noqa: E402
+from merge import MERGE_PROVIDERS, MERGED_SOURCE, MergedCoach, merge_coaches  # noqa: E402
+from metrics import (COACHES_PARSED, CYCLE_SECONDS, DIFF_SECONDS, METRICS_PORT, PARSE_SECONDS,  # noqa: E402
+                     QUERY_SINCE_SUCCESS, RESPONSES_UNCHANGED, start_metrics_server)
+from notifier import NOTIFY_SINKS, Dispatcher, build_sinks  # noqa: E402
+from providers import get_provider, get_providers  # noqa: E402
+from sharding import (SHARD_LEASE_SECONDS, SHARD_SERVER_URL, SHARDING, WORKER_ID,  # noqa: E402
+                      RemoteShardCoordinator, ShardCoordinator)
+from state_store import STATE_DB, StateStore, scoped_source  # noqa: E402
+from rules import RuleLoader  # noqa: E402
+from release_windows import (BURST_POLL_SECONDS, RELEASE_RELEARN_SECONDS, RELEASE_WINDOWS,  # noqa: E402
+                             ReleaseWindows, learn_windows)
+from scheduler import QueryScheduler  # noqa: E402
+from watchlist import build_watch_queries, parse_dates  # noqa: E402
+
 # Configure from environment variables
 CHECK_INTERVAL_MINUTES = int(os.getenv("CHECK_INTERVAL_MINUTES", "3"))
-PUSHBULLET_API_KEY = os.getenv("PUSHBULLET_API_KEY")
 TRAVEL_DATE = os.getenv("TRAVEL_DATE")
 RETURN_DATE = os.getenv("RETURN_DATE")
 SEARCH_ONWORD = os.getenv("SEARCH_ONWORD", "True").lower() == "true"
 SEARCH_RETURN = os.getenv("SEARCH_RETURN", "True").lower() == "true"
 
-# BDTickets Configuration
-BDTICKETS_API_URL = "https://api.bdtickets.com:20102/v1/coaches/search"
-BDTICKETS_ONWARD_ROUTES = ["dhaka-to-rajshahi", "dhaka-to-chapainawabganj"]
-BDTICKETS_RETURN_ROUTES = ["rajshahi-to-dhaka", "chapainawabganj-to-dhaka"]
-
-# BusBD Configuration
-BUSBD_API_URL = "https://api.busbd.com.bd/api/v2/searchlist"
-DHAKA_ID = 14
-RAJSHAHI_ID = 55
-CHAPAI_ID = 9
-
-# Target companies (same for both sources)
-TARGET_COMPANIES = [
-    "National Travels", "Desh Travels", "Grameen Travels",
-    "KTC Hanif", "Hanif Enterprise", "Shyamoli N.R Travels",
-    "Shyamoli NR Travels"
-]
-
-# Initialize Pushbullet
-pb = Pushbullet(PUSHBULLET_API_KEY)
-
-def log_message(message, source=None):
-    timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    source_prefix = f"[{source}] " if source else ""
-    log_entry = f"[{timestamp}] {source_prefix}{message}"
-    print(log_entry)
-
-# ==================== BDTickets Functions ====================
-
-def check_bdtickets(travel_date, routes, journey_type):
-    log_message(f"Checking {journey_type} tickets for {travel_date}...", "BDTickets")
-    found_tickets = []
-    tickets_for_cache = []
-
-    for route in routes:
-        log_message(f"Checking route: {route}", "BDTickets")
-        payload = {
-            "date": travel_date,
-            "identifier": route,
-            "structureType": "BUS"
-        }
-
-        try:
-            response = requests.post(BDTICKETS_API_URL, json=payload, headers={"Content-Type": "application/json"})
-            response.raise_for_status()
-            data = response.json()
-
-            if data.get("data"):
-                for coach in data["data"]:
-                    company_name = coach.get("companyName", "")
-                    coach_no = coach.get("coachNo", "")
-                    if company_name in TARGET_COMPANIES:
-                        found_tickets.append({
-                            "company": company_name,
-                            "coach_no": coach_no,
-                            "route": route,
-                            "journey_type": journey_type,
-                            "source": "BDTickets"
-                        })
-                        tickets_for_cache.append({"coach_no": coach_no})
-
-        except Exception as e:
-            log_message(f"Error checking {route}: {str(e)}", "BDTickets")
-
-    return found_tickets, tickets_for_cache
-
-def save_bdtickets_cache(onward_tickets, return_tickets):
-    cache_data = {
-        "onward": onward_tickets,
-        "return": return_tickets
-    }
-    with open("ticket_cache.json", "w") as f:
-        json.dump(cache_data, f)
-
-def load_bdtickets_cache():
-    try:
-        with open("ticket_cache.json", "r") as f:
-            data = json.load(f)
-            return data.get("onward", []), data.get("return", [])
-    except (FileNotFoundError, json.JSONDecodeError):
-        return [], []
-
-# ==================== BusBD Functions ====================
-
-def check_busbd(travel_date, from_ids, to_ids, journey_type):
-    log_message(f"Checking {journey_type.lower()} tickets for {travel_date}...", "BusBD")
-    found_tickets = []
-    tickets_for_cache = []
-
-    for from_id in from_ids:
-        for to_id in to_ids:
-            log_message(f"Checking from_id: {from_id} -> to_id: {to_id}", "BusBD")
-            payload = {
-                "jrdate": travel_date,
-                "fromid": from_id,
-                "toid": to_id,
-                "coach_type": None
-            }
-
-            try:
-                response = requests.post(BUSBD_API_URL, json=payload, headers={"Content-Type": "application/json"})
-                response.raise_for_status()
-                data = response.json()
-
-                if data.get("data") and data["data"].get("coaches"):
-                    for coach in data["data"]["coaches"]:
-                        company_name = coach.get("company_name", "")
-                        coach_no = coach.get("coach_no", "")
-                        if company_name in TARGET_COMPANIES:
-                            found_tickets.append({
-                                "company": company_name,
-                                "coach_no": coach_no,
-                                "route": f"{coach.get('route_name', '')}",
-                                "journey_type": journey_type,
-                                "source": "BusBD"
-                            })
-                            tickets_for_cache.append({"coach_no": coach_no})
-
-            except Exception as e:
-                log_message(f"Error checking from_id {from_id} to_id {to_id}: {str(e)}", "BusBD")
-
-    return found_tickets, tickets_for_cache
-
-def save_busbd_cache(tickets):
-    with open("ticket_cache_busbd.json", "w") as f:
-        json.dump(tickets, f)
-
-def load_busbd_cache():
+# TRAVEL_DATE / RETURN_DATE may be one date, a range (2026-03-03..2026-03-07)
+# or a comma separated list; every date is checked in the same sweep
+TRAVEL_DATES = parse_dates(TRAVEL_DATE) if SEARCH_ONWORD else []
+RETURN_DATES = parse_dates(RETURN_DATE) if SEARCH_RETURN else []
+
+# Providers to monitor (comma separated names, default: every registered provider)
+ENABLED_PROVIDERS = os.getenv("ENABLED_PROVIDERS", "").split(",")
+
+# Concurrency: send every provider/route/date query of a cycle at once,
+# capped per provider (<NAME>_MAX_WORKERS) so we never flood one API
+CONCURRENT_CHECKS = os.getenv("CONCURRENT_CHECKS", "True").lower() == "true"
+
+# Poll each query on its own schedule (see scheduler.py) instead of fixed cycles
+ADAPTIVE_POLLING = os.getenv("ADAPTIVE_POLLING", "False").lower() == "true"
+
+# Legacy JSON cache files, imported into the state store once
+LEGACY_CACHE_FILES = {
+    "BDTickets": "ticket_cache.json",
+    "BusBD": "ticket_cache_busbd.json",
+}
+
+# Which coaches to alert on, from WATCH_RULES_FILE (see rules.py); reloaded when the file changes
+watch_rules = RuleLoader()
+_rules_version = watch_rules.version
+
+PROVIDERS = get_providers(ENABLED_PROVIDERS)
+
+# Notifier, executors and state store are built on first use, so importing
+# this module (or running check-config) opens no connection, executor or
+# database. Importing still starts the logger's queue thread (logger.py) and
+# reads WATCH_RULES_FILE through RuleLoader above.
+_notifier = None
+_state_store = None
+_provider_executors = {}
+_init_lock = threading.Lock()
+
+def get_notifier():
+    """Notification dispatcher; a queue drained by a background worker (see notifier.py)"""
+    global _notifier
+    if _notifier is None:
+        with _init_lock:
+            if _notifier is None:
+                _notifier = Dispatcher(build_sinks())
+    return _notifier
+
+def get_state_store():
+    """Seen coaches, persisted in SQLite (see state_store.py)"""
+    global _state_store
+    if _state_store is None:
+        with _init_lock:
+            if _state_store is None:
+                _state_store = StateStore()
+    return _state_store
+
+def get_executor(provider):
+    """One executor per provider: its max_workers is the provider's concurrency cap,
+    and the provider's keep-alive pool is sized to match"""
+    executor = _provider_executors.get(provider.name)
+    if executor is None:
+        with _init_lock:
+            executor = _provider_executors.get(provider.name)
+            if executor is None:
+                get_session(provider.name, provider.max_workers)
+                executor = _provider_executors[provider.name] = ThreadPoolExecutor(
+                    max_workers=max(1, provider.max_workers), thread_name_prefix=provider.name.lower())
+    return executor
+
+def shutdown(timeout=30):
+    """Deliver queued notifications and stop whatever was started"""
+    wait_for_alerts(timeout)
+    if _notifier is not None:
+        _notifier.stop(timeout=timeout)
+    for executor in _provider_executors.values():
+        executor.shutdown(wait=False)
+    capture = get_writer()
+    if capture:
+        capture.close()
+    flush_history()
+
+def flush_history():
+    history = get_history()
+    if history:
+        history.flush()
+
+# Last response fingerprint per query (see fingerprints.py)
+response_cache = ResponseCache()
+
+# ==================== Provider Checks ====================
+
+def current_rules():
+    """Watch rules in force; when the rule file was reloaded, cached parse results are dropped"""
+    global _rules_version
+    rules = watch_rules.current()
+    if watch_rules.version != _rules_version:
+        _rules_version = watch_rules.version
+        response_cache.clear()
+    return rules
+
+def process_response(provider, query, response, rules=None, observed_at=None):
+    """Parse one response into (coaches, changed), keeping coaches that match rules (default: watch rules).
+
+    A response identical to the previous one for this query (same body hash,
+    or 304 Not Modified) is not parsed again; its cached coaches come back
+    with changed=False. A 304 with nothing cached (e.g. replaying a later
+    capture file on its own) has no coaches to give and returns None, like a
+    failed query.
+    """
+    coaches = response_cache.lookup(query, response)
+    if coaches is not None:
+        RESPONSES_UNCHANGED.inc(provider=provider.name)
+        return coaches, False
+    if response.status_code == 304:
+        log_message(f"Not Modified for {provider.describe(query)} with no earlier response, skipped",
+                    provider.name, date=query.travel_date, route=query.route)
+        return None
+    with PARSE_SECONDS.time(provider=provider.name):
+        rules = rules or watch_rules.current()
+        coaches = rules.select(provider.parse_response(query, response, rules))
+    COACHES_PARSED.inc(len(coaches), provider=provider.name)
+    history = get_history()
+    if history:
+        history.record(query, coaches, observed_at)
+    response_cache.store(query, response, coaches)
+    return coaches, True
+
+def run_query(provider, query, rules=None):
+    """Fetch and parse one query. Returns process_response()'s (coaches, changed), or None on error."""
+    log_message(f"Checking {query.travel_date} route: {provider.describe(query)}", provider.name,
+                routine=True, date=query.travel_date, route=query.route)
+    capture = get_writer()
     try:
-        with open("ticket_cache_busbd.json", "r") as f:
-            return json.load(f)
-    except (FileNotFoundError, json.JSONDecodeError):
-        return []
+        response = provider.request(query, headers=response_cache.conditional_headers(query))
+        QUERY_SINCE_SUCCESS.touch(provider=provider.name, date=query.travel_date, route=query.route)
+        if capture:
+            capture.record(query, response)
+        return process_response(provider, query, response, rules)
+    except Exception as e:
+        if capture:
+            capture.record(query, error=e)
+        log_message(f"Error checking {query.travel_date} {provider.describe(query)}: {str(e)}", provider.name,
+                    level="error", date=query.travel_date, route=query.route)
+        return None
+
+def run_queries(watch_queries, rules=None):
+    """Run (provider, query) pairs as one batch; returns one run_query result per pair.
+
+    Queries go to their provider's executor all at once, so the batch takes
+    roughly (queries per provider / provider cap) round-trips no matter how
+    many dates or routes are watched.
+    """
+    rules = rules or current_rules()
+    capture = get_writer()
+    if capture:
+        capture.start_cycle()
+    if not CONCURRENT_CHECKS:
+        results = [run_query(provider, query, rules) for provider, query in watch_queries]
+        flush_history()
+        return results
+    futures = [get_executor(provider).submit(run_query, provider, query, rules)
+               for provider, query in watch_queries]
+    results = [future.result() for future in futures]
+    flush_history()
+    return results
+
+def group_found(query_results):
+    """{(provider name, journey_type): [Coach]} from ((provider, query), coaches) pairs"""
+    found = {}
+    for (provider, query), coaches in query_results:
+        found.setdefault((provider.name, query.journey_type), []).extend(coaches or [])
+    return found
+
+def run_sweep(watch_queries):
+    """Run every (provider, query) of a cycle as one batch.
+
+    Returns the coaches grouped by provider and journey, the names of
+    providers where at least one query changed since last time, and the
+    travel dates without a result (see unresolved_dates).
+    """
+    query_results = []
+    changed_providers = set()
+    for (provider, query), result in zip(watch_queries, run_queries(watch_queries)):
+        if result is None:
+            # Failed query: carry its last good result so those coaches aren't
+            # flagged gone (and re-alerted once the API recovers)
+            coaches = response_cache.last_coaches(query)
+        else:
+            coaches, changed = result
+            if changed:
+                changed_providers.add(provider.name)
+        query_results.append(((provider, query), coaches))
+    return group_found(query_results), changed_providers, unresolved_dates(query_results)
+
+def unresolved_dates(query_results):
+    """{(provider name, journey_type): travel dates} of queries with no result at all.
+
+    A query that fails before it ever succeeded in this process (e.g. the
+    first cycle after a restart) has nothing to carry over; the stored coaches
+    of its date must not be flagged absent, or they all come back as
+    "Seats back" once the API recovers.
+    """
+    unresolved = {}
+    for (provider, query), coaches in query_results:
+        if coaches is None:
+            unresolved.setdefault((provider.name, query.journey_type), set()).add(query.travel_date)
+    return unresolved
+
+def get_journeys():
+    journeys = []
+    if SEARCH_ONWORD:
+        journeys.append(("Onward", TRAVEL_DATES))
+    if SEARCH_RETURN:
+        journeys.append(("Return", RETURN_DATES))
+    return journeys
 
 # ==================== Common Functions ====================
 
-def send_notification(tickets, journey_type, source):
-    if not tickets:
-        return
-
-    unique_routes = set(ticket['route'] for ticket in tickets)
-    unique_companies = set(ticket['company'] for ticket in tickets)
+def format_notification(events, journey_type, source, details=None):
+    """(title, body) of the alert for a list of events, with trip detail by coach key if given"""
+    tickets = [event.coach for event in events]
+    available = [event for event in events if event.kind in (NEW_COACH, SEATS_REOPENED)]
+    unique_routes = set(ticket.route for ticket in tickets)
+    unique_companies = set(ticket.company for ticket in tickets)
+    unique_dates = sorted(set(ticket.travel_date for ticket in tickets))
 
     title = f"🚌 {journey_type} Bus Availability - {source}"
-    body = f"Available Buses: {len(tickets)}\n"
+    body = f"Available Buses: {len(available)}\n"
     body += f"Companies: {', '.join(unique_companies)}\n"
-    body += f"Routes: {', '.join(unique_routes)}"
+    body += f"Routes: {', '.join(unique_routes)}\n"
+    body += f"Dates: {', '.join(unique_dates)}\n"
+    body += "\n".join(event_line(event, details or {}) for event in events)
+    return title, body
+
+def event_line(event, details):
+    """describe_event(), plus every seller's offer for a merged coach and the trip detail"""
+    line = describe_event(event)
+    if isinstance(event.coach, MergedCoach) and len(event.coach.offers) > 1:
+        line += f"\n    {event.coach.describe_offers()}"
+    detail = details.get(event.coach.key)
+    if detail:
+        line += f"\n    {describe_detail(detail)}"
+    return line
+
+def lookup_details(events):
+    """{coach key: Future of its CoachDetail} for the coaches of an alert, run on their providers' executors"""
+    if not DETAIL_LOOKUPS:
+        return {}
+    futures = {}
+    for event in events:
+        coach = event.coach
+        seller = coach.best if isinstance(coach, MergedCoach) else coach
+        provider = get_provider(seller.source)
+        if coach.key in futures or not supports_detail(provider, seller):
+            continue
+        if len(futures) >= DETAIL_MAX_PER_ALERT:
+            break
+        futures[coach.key] = get_executor(provider).submit(get_detail, provider, seller)
+    return futures
 
-    try:
-        pb.push_note(title, body)
-        log_message(f"Notification sent: {title}", source)
-    except Exception as e:
-        log_message(f"Failed to send notification: {str(e)}", source)
+# Alerts still waiting for their detail lookups; shutdown() lets them finish
+_pending_alerts = set()
+_pending_lock = threading.Lock()
 
-def get_new_tickets(current_tickets, cached_tickets):
-    if not cached_tickets:
-        return current_tickets
+def send_notification(events, journey_type, source, notifier=None):
+    """Queue the alert for a list of events on notifier (default: the monitor's dispatcher).
 
-    cached_keys = {ticket['coach_no'] for ticket in cached_tickets}
-    return [ticket for ticket in current_tickets if ticket['coach_no'] not in cached_keys]
+    With detail lookups the alert is queued by whichever lookup finishes last,
+    so neither the detail requests nor their rate-limit waits hold up polling.
+    """
+    if not events:
+        return
+    notifier = notifier or get_notifier()
+    futures = lookup_details(events)
+    if not futures:
+        # Delivered by the background dispatcher so a slow sink never delays polling
+        notifier.notify(*format_notification(events, journey_type, source), source)
+        return
+
+    done = threading.Event()
+    remaining = [len(futures)]
+    with _pending_lock:
+        _pending_alerts.add(done)
+
+    def lookup_finished(_):
+        with _pending_lock:
+            remaining[0] -= 1
+            if remaining[0]:
+                return
+        try:
+            details = {key: future.result() for key, future in futures.items()
+                       if not future.cancelled() and future.exception() is None}
+            title, body = format_notification(events, journey_type, source,
+                                              {key: detail for key, detail in details.items() if detail})
+            notifier.notify(title, body, source)
+        finally:
+            with _pending_lock:
+                _pending_alerts.discard(done)
+            done.set()
+
+    for future in futures.values():
+        future.add_done_callback(lookup_finished)
+
+def wait_for_alerts(timeout=None):
+    """Block until every alert waiting on detail lookups has been queued for delivery"""
+    with _pending_lock:
+        pending = list(_pending_alerts)
+    for done in pending:
+        done.wait(timeout)
 
 # ==================== Main Monitoring Loop ====================
 
-def monitor_bdtickets():
-    """Monitor BDTickets.com for ticket availability"""
+def monitor_provider(provider, found, unresolved=None):
+    """Diff, record and notify one provider's results from a sweep"""
     try:
-        cached_onward_tickets, cached_return_tickets = load_bdtickets_cache()
-        onward_cache = []
-        return_cache = []
-
-        if SEARCH_ONWORD:
-            onward_tickets, onward_cache = check_bdtickets(TRAVEL_DATE, BDTICKETS_ONWARD_ROUTES, "Onward")
-            new_onward_tickets = get_new_tickets(onward_tickets, cached_onward_tickets)
-            if new_onward_tickets:
-                log_message(f"Found {len(new_onward_tickets)} NEW onward buses to notify about", "BDTickets")
-                send_notification(new_onward_tickets, "Onward", "BDTickets")
-
-        if SEARCH_RETURN:
-            return_tickets, return_cache = check_bdtickets(RETURN_DATE, BDTICKETS_RETURN_ROUTES, "Return")
-            new_return_tickets = get_new_tickets(return_tickets, cached_return_tickets)
-            if new_return_tickets:
-                log_message(f"Found {len(new_return_tickets)} NEW return buses to notify about", "BDTickets")
-                send_notification(new_return_tickets, "Return", "BDTickets")
-
-        # Save updated cache
-        save_bdtickets_cache(onward_cache, return_cache)
+        for journey_type, _ in get_journeys():
+            tickets = found.get((provider.name, journey_type), [])
+            with DIFF_SECONDS.time(provider=provider.name):
+                previous = get_state_store().load_snapshots(provider.name, journey_type, tickets)
+                events = diff_coaches(previous, tickets)
+                # Record what we saw in one transaction
+                get_state_store().sync(provider.name, journey_type, tickets,
+                                       keep_dates=(unresolved or {}).get((provider.name, journey_type), ()))
+            if events:
+                log_message(f"Found {len(events)} {journey_type.lower()} changes to notify about", provider.name,
+                            journey=journey_type, events=len(events))
+                send_notification(events, journey_type, provider.name)
 
     except Exception as e:
-        log_message(f"Error in BDTickets monitoring: {str(e)}", "BDTickets")
+        log_message(f"Error in {provider.name} monitoring: {str(e)}", provider.name, level="error")
 
-def monitor_busbd():
-    """Monitor BusBD.com for ticket availability"""
+def monitor_merged(found, unresolved=None):
+    """Diff, record and notify every provider's results as one merged view (see merge.py)"""
+    source = " + ".join(provider.name for provider in PROVIDERS)
     try:
-        cached_tickets = load_busbd_cache()
-        all_new_tickets = []
-        updated_cache = []
-
-        if SEARCH_ONWORD:
-            from_ids = [DHAKA_ID]
-            to_ids = [RAJSHAHI_ID, CHAPAI_ID]
-            onward_tickets, onward_cache = check_busbd(TRAVEL_DATE, from_ids, to_ids, "Onward")
-            new_onward = get_new_tickets(onward_tickets, cached_tickets)
-            if new_onward:
-                log_message(f"Found {len(new_onward)} NEW onward buses to notify about", "BusBD")
-                send_notification(new_onward, "Onward", "BusBD")
-                all_new_tickets.extend(new_onward)
-                updated_cache.extend(onward_cache)
-
-        if SEARCH_RETURN:
-            from_ids = [RAJSHAHI_ID, CHAPAI_ID]
-            to_ids = [DHAKA_ID]
-            return_tickets, return_cache = check_busbd(RETURN_DATE, from_ids, to_ids, "Return")
-            new_return = get_new_tickets(return_tickets, cached_tickets)
-            if new_return:
-                log_message(f"Found {len(new_return)} NEW return buses to notify about", "BusBD")
-                send_notification(new_return, "Return", "BusBD")
-                all_new_tickets.extend(new_return)
-                updated_cache.extend(return_cache)
-
-        # Save updated cache
-        if all_new_tickets:
-            save_busbd_cache(updated_cache)
+        for journey_type, _ in get_journeys():
+            coaches = [coach for provider in PROVIDERS for coach in found.get((provider.name, journey_type), [])]
+            tickets = merge_coaches(coaches)
+            keep_dates = set().union(*((unresolved or {}).get((provider.name, journey_type), ())
+                                       for provider in PROVIDERS))
+            with DIFF_SECONDS.time(provider=MERGED_SOURCE):
+                previous = get_state_store().load_snapshots(MERGED_SOURCE, journey_type, tickets)
+                events = diff_coaches(previous, tickets)
+                get_state_store().sync(MERGED_SOURCE, journey_type, tickets, keep_dates=keep_dates)
+            if events:
+                log_message(f"Found {len(events)} {journey_type.lower()} changes to notify about", source,
+                            journey=journey_type, events=len(events))
+                send_notification(events, journey_type, source)
 
     except Exception as e:
-        log_message(f"Error in BusBD monitoring: {str(e)}", "BusBD")
+        log_message(f"Error in merged monitoring: {str(e)}", source, level="error")
+
+def monitor_changes(changed_providers, found, unresolved=None):
+    """Diff and notify after a sweep: each changed provider on its own, or everything merged"""
+    if MERGE_PROVIDERS:
+        if changed_providers:
+            monitor_merged(found, unresolved)
+        else:
+            log_message("No changes since last check, skipping diff", routine=True)
+        return
+    # Monitor each source independently; if one fails, the others continue
+    for provider in PROVIDERS:
+        if provider.name not in changed_providers:
+            log_message("No changes since last check, skipping diff", provider.name, routine=True)
+            continue
+        monitor_provider(provider, found, unresolved)
+
+def run_cycle(watch_queries=None):
+    """One full check: a single batched sweep over every provider, journey and date"""
+    if watch_queries is None:
+        watch_queries = build_watch_queries(PROVIDERS, get_journeys())
+    log_message(f"Sweeping {len(watch_queries)} queries...")
+    skipped_before = response_cache.skipped()
+    found, changed_providers, unresolved = run_sweep(watch_queries)
+    log_message(f"Unchanged responses: {response_cache.skipped() - skipped_before}/{len(watch_queries)} "
+                f"(total skipped: {response_cache.skipped()})")
+    monitor_changes(changed_providers, found, unresolved)
+
+def replay_captures(paths):
+    """Feed captured cycles (see capture.py) through parse, filter, diff and notify with no network.
+
+    Records are streamed; only one captured cycle is held in memory at a time.
+    A captured cycle may hold only part of the watch list (the queries that
+    were due with ADAPTIVE_POLLING or RELEASE_WINDOWS, one worker's share with
+    SHARDING), so as in run_adaptive the latest result of every query replayed
+    so far is diffed, not just the cycle's own. Returns the number of cycles replayed.
+    """
+    cycles = 0
+    batch = []
+    cycle_id = None
+    latest_results = {}
+    for record in read_captures(paths):
+        if batch and record.get("cycle") != cycle_id:
+            replay_cycle(batch, latest_results)
+            cycles += 1
+            batch = []
+        cycle_id = record.get("cycle")
+        batch.append(record)
+    if batch:
+        replay_cycle(batch, latest_results)
+        cycles += 1
+    return cycles
+
+def replay_cycle(records, latest_results):
+    """Replay one captured cycle; latest_results maps (provider, query) to its last coaches (None if never answered)"""
+    rules = current_rules()
+    changed_providers = set()
+    replayed = 0
+    for record in records:
+        provider = get_provider(record["provider"])
+        if provider not in PROVIDERS:
+            continue
+        item = (provider, query_from_record(record))
+        replayed += 1
+        result = None if "error" in record else process_response(provider, item[1], ReplayResponse(record),
+                                                                   rules, record["time"])
+        if result is None:
+            # Failed query: keep its last good result, as a live sweep does
+            latest_results.setdefault(item, None)
+            continue
+        coaches, changed = result
+        latest_results[item] = coaches
+        if changed:
+            changed_providers.add(provider.name)
+    flush_history()
+    if replayed:
+        log_message(f"Replaying {replayed} captured queries ({len(latest_results)} known)...")
+        monitor_changes(changed_providers, group_found(latest_results.items()), unresolved_dates(latest_results.items()))
+
+def run_shard_cycle(coordinator):
+    """One sharded check: poll only the queries this worker leases (see sharding.py).
+
+    Alert history is kept per query (on the shard server when workers span
+    hosts), so a query can move to another worker without its coaches being
+    alerted again.
+    """
+    state = coordinator.alert_store or get_state_store()
+    watch_queries = coordinator.claim(build_watch_queries(PROVIDERS, get_journeys()))
+    log_message(f"Worker {coordinator.worker_id} leases {len(watch_queries)} queries "
+                f"({coordinator.live_workers} workers)")
+    events_by_journey = {}
+    for (provider, query), result in zip(watch_queries, run_queries(watch_queries)):
+        # A failed query keeps its history untouched until it can be checked again
+        if result is None or not result[1]:
+            continue
+        if not coordinator.holds(query):
+            log_message(f"Lease on {query.route} {query.travel_date} lost during the check, skipping", provider.name)
+            continue
+        coaches = result[0]
+        source = scoped_source(provider.name, f"{query.route}|{query.travel_date}")
+        with DIFF_SECONDS.time(provider=provider.name):
+            previous = state.load_snapshots(source, query.journey_type, key_source=provider.name)
+            events = diff_coaches(previous, coaches)
+            state.sync(source, query.journey_type, coaches)
+        events_by_journey.setdefault((provider.name, query.journey_type), []).extend(events)
+
+    for (source, journey_type), events in events_by_journey.items():
+        if events:
+            log_message(f"Found {len(events)} {journey_type.lower()} changes to notify about", source,
+                        journey=journey_type, events=len(events))
+            send_notification(events, journey_type, source)
+
+def check(coordinator=None):
+    """One fixed-interval check: the whole watch list, or this worker's shard of it"""
+    if coordinator:
+        run_shard_cycle(coordinator)
+    else:
+        run_cycle()
+
+def shard_coordinator():
+    """The ShardCoordinator when SHARDING is on, else None"""
+    if not SHARDING:
+        return None
+    lease_seconds = SHARD_LEASE_SECONDS or 3 * CHECK_INTERVAL_MINUTES * 60
+    if SHARD_SERVER_URL:
+        return RemoteShardCoordinator(lease_seconds)
+    return ShardCoordinator(lease_seconds)
+
+def coach_signature(coaches):
+    return frozenset((coach.key, coach.seats, coach.fare) for coach in coaches)
+
+def run_adaptive(windows=None):
+    """Poll each query on its own schedule instead of fixed full cycles.
+
+    With release windows but without ADAPTIVE_POLLING every query keeps the
+    flat CHECK_INTERVAL_MINUTES interval outside the windows' adjustments.
+    """
+    if ADAPTIVE_POLLING:
+        scheduler = QueryScheduler(windows=windows)
+    else:
+        flat = CHECK_INTERVAL_MINUTES * 60
+        scheduler = QueryScheduler(flat, flat, jitter=0, windows=windows)
+    latest_results = {}
+    watch_queries = build_watch_queries(PROVIDERS, get_journeys())
+    for provider, query in watch_queries:
+        scheduler.add((provider, query), query.travel_date, window_key=(provider.name, query.route))
 
-def main():
-    log_message("=" * 60)
+    while True:
+        if windows is not None and time.time() - windows.learned_at >= RELEASE_RELEARN_SECONDS:
+            learn_windows(windows, current_rules())
+        due = scheduler.pop_due()
+        if not due:
+            next_deadline = scheduler.next_deadline()
+            if next_deadline is None:
+                log_message("Nothing left to watch")
+                return
+            sleep_until_next_check(max(0, next_deadline - time.time()), warm_targets())
+            continue
+
+        log_message(f"Polling {len(due)} due queries ({len(scheduler)} waiting)...")
+        changed_providers = set()
+        for item, result in zip(due, run_queries(due)):
+            if result is None:
+                # Failed poll: keep the last good result and treat it as unchanged
+                scheduler.record(item, scheduler.last_signature(item))
+                continue
+            coaches, changed = result
+            if not changed:
+                scheduler.record(item, scheduler.last_signature(item))
+                continue
+            latest_results[item] = coaches
+            scheduler.record(item, coach_signature(coaches))
+            changed_providers.add(item[0])
+
+        for item in due:
+            if item not in scheduler:
+                # Departed: stop diffing its last result too
+                latest_results.pop(item, None)
+
+        if changed_providers:
+            # Queries that haven't succeeded yet have no coaches to diff against
+            unresolved = unresolved_dates((item, latest_results.get(item)) for item in watch_queries
+                                          if item in scheduler)
+            monitor_changes({provider.name for provider in changed_providers}, group_found(latest_results.items()),
+                            unresolved)
+
+def warm_targets():
+    """(provider, url, connections) to pre-warm before the next cycle"""
+    return [
+        (provider.name, provider.api_url, provider.max_workers if CONCURRENT_CHECKS else 1)
+        for provider in PROVIDERS
+    ]
+
+def start():
+    """Log the configuration, start the metrics server and import legacy caches"""
+    log_separator()
     log_message("Unified Bus Ticket Monitor Started")
-    log_message(f"Monitoring: BDTickets.com & BusBD.com")
+    log_message(f"Monitoring: {' & '.join(provider.name for provider in PROVIDERS)}")
     log_message(f"Check Interval: {CHECK_INTERVAL_MINUTES} minutes")
-    log_message(f"Travel Date: {TRAVEL_DATE}")
-    log_message(f"Return Date: {RETURN_DATE}")
+    log_message(f"Travel Dates: {', '.join(TRAVEL_DATES)}")
+    log_message(f"Return Dates: {', '.join(RETURN_DATES)}")
     log_message(f"Search Onward: {SEARCH_ONWORD}")
     log_message(f"Search Return: {SEARCH_RETURN}")
-    log_message("=" * 60)
+    log_message(f"HTTP Timeouts: connect {HTTP_CONNECT_TIMEOUT}s, read {HTTP_READ_TIMEOUT}s")
+    log_message(f"Concurrent Checks: {CONCURRENT_CHECKS} "
+                f"({', '.join(f'{provider.name} max {provider.max_workers}' for provider in PROVIDERS)})")
+    log_message(f"Adaptive Polling: {ADAPTIVE_POLLING}")
+    if DETAIL_LOOKUPS:
+        with_detail = ", ".join(provider.name for provider in PROVIDERS if provider.detail_url)
+        log_message(f"Detail Lookups: {with_detail or 'no provider detail URL set'}")
+    else:
+        log_message("Detail Lookups: False")
+    log_message(f"Merge Providers: {MERGE_PROVIDERS}" + (" (not used with sharding)"
+                                                         if MERGE_PROVIDERS and SHARDING else ""))
+    log_message(f"Release Windows: {RELEASE_WINDOWS}" + (f" (bursts every {BURST_POLL_SECONDS:g}s)"
+                                                         if RELEASE_WINDOWS else ""))
+    if SHARDING:
+        log_message(f"Sharding: worker {WORKER_ID} via {SHARD_SERVER_URL or STATE_DB}" + (" (per-query scheduling is not used with sharding)"
+                                                        if ADAPTIVE_POLLING or RELEASE_WINDOWS else ""))
+    if RELEASE_WINDOWS and not HISTORY_DIR:
+        log_message("Release windows need HISTORY_DIR to learn from; polling stays on the plain schedule",
+                    level="warning")
+    log_message(f"State DB: {STATE_DB}")
+    log_message(f"Notification Sinks: {NOTIFY_SINKS}")
+    log_message(f"Watch Rules: {watch_rules.path if os.path.exists(watch_rules.path) else 'default company list'}")
+    if CAPTURE_DIR:
+        log_message(f"Capturing responses to: {CAPTURE_DIR}")
+    if HISTORY_DIR:
+        log_message(f"Recording availability history to: {HISTORY_DIR}")
+    if start_metrics_server():
+        log_message(f"Metrics: http://0.0.0.0:{METRICS_PORT}/metrics")
+    log_separator()
+
+    for provider in PROVIDERS:
+        if provider.name in LEGACY_CACHE_FILES:
+            imported = get_state_store().migrate_json_cache(provider.name, LEGACY_CACHE_FILES[provider.name], get_journeys())
+            if imported:
+                log_message(f"Imported {imported} coaches from {LEGACY_CACHE_FILES[provider.name]}", provider.name)
+
+def run_once():
+    """One check cycle, then deliver pending notifications and exit (for cron / serverless timers)"""
+    start()
+    cycle_start = time.monotonic()
+    try:
+        # Leases are kept on exit, so the next scheduled run continues the same shard
+        check(shard_coordinator())
+        CYCLE_SECONDS.observe(time.monotonic() - cycle_start)
+        log_message(f"Check cycle completed in {time.monotonic() - cycle_start:.1f}s")
+    finally:
+        shutdown()
+
+def main():
+    start()
+    coordinator = shard_coordinator()
+
+    if (ADAPTIVE_POLLING or RELEASE_WINDOWS) and not coordinator:
+        windows = None
+        if RELEASE_WINDOWS:
+            windows = ReleaseWindows()
+            learn_windows(windows, current_rules())
+        try:
+            run_adaptive(windows)
+        except KeyboardInterrupt:
+            log_message("Monitor stopped by user")
+        shutdown()
+        return
 
     while True:
         try:
-            log_message("\n" + "=" * 60)
+            log_separator()
             log_message("Starting new check cycle...")
-            log_message("=" * 60)
+            log_separator()
 
-            # Monitor both sources independently
-            # If one fails, the other will continue
-            monitor_bdtickets()
-            monitor_busbd()
+            cycle_start = time.monotonic()
+            check(coordinator)
+            CYCLE_SECONDS.observe(time.monotonic() - cycle_start)
 
-            log_message("=" * 60)
-            log_message(f"Check cycle completed. Sleeping for {CHECK_INTERVAL_MINUTES} minutes...")
-            log_message("=" * 60 + "\n")
+            log_separator()
+            log_message(f"Check cycle completed in {time.monotonic() - cycle_start:.1f}s. Sleeping for {CHECK_INTERVAL_MINUTES} minutes...")
+            log_separator()
 
-            time.sleep(CHECK_INTERVAL_MINUTES * 60)
+            sleep_until_next_check(CHECK_INTERVAL_MINUTES * 60, warm_targets())
 
         except KeyboardInterrupt:
             log_message("Monitor stopped by user")
+            if coordinator:
+                coordinator.release()
+            shutdown()
             break
         except Exception as e:
-            log_message(f"Unexpected error in main loop: {str(e)}")
+            log_message(f"Unexpected error in main loop: {str(e)}", level="error")
             log_message(f"Retrying in {CHECK_INTERVAL_MINUTES} minutes...")
             time.sleep(CHECK_INTERVAL_MINUTES * 60)
 
 if __name__ == "__main__":
     main()
-
@@ -0,0 +1,115 @@
+"""One record per physical coach across providers.
+
+Several sites sell seats on the same departure. With MERGE_PROVIDERS=True
+coaches from every provider are grouped by journey, date, company, route
+(origin and destination), departure time and coach type. Each group becomes
+one MergedCoach that lists every provider's offer, is diffed and stored
+once, and is alerted once, naming the seller to book with. Coaches without
+a departure time, or in a group where one provider lists several coaches,
+cannot be matched safely and stay on their own.
+"""
+import os
+import re
+
+from dotenv import load_dotenv
+load_dotenv()
+
+from providers import Coach  # noqa: E402
+from rules import minutes_of_day, normalize_name  # noqa: E402
+
+MERGE_PROVIDERS = os.getenv("MERGE_PROVIDERS", "False").lower() == "true"
+
+# State store source of merged coaches
+MERGED_SOURCE = "Merged"
+
+_ROUTE_SEPARATORS = re.compile(r"\s+to\s+|-to-|->|→|–|-|/|,")
+
+
+def route_places(route):
+    """(origin, destination) of 'dhaka-to-rajshahi', 'Dhaka - Rajshahi' or 'Dhaka to Rajshahi', else None"""
+    places = [normalize_name(part) for part in _ROUTE_SEPARATORS.split(route or "")]
+    places = [place for place in places if place]
+    if len(places) < 2:
+        return None
+    return places[0], places[-1]
+
+
+def offer_rank(coach):
+    """Sort key of a seller's offer: available first, then cheapest, then most seats"""
+    return (coach.seats == 0,
+            coach.fare is None, coach.fare or 0,
+            -(coach.seats or 0))
+
+
+class MergedCoach(Coach):
+    """A departure sold by one or more providers; seats and fare come from the best offer"""
+    __slots__ = ("offers", "departure")
+
+    def __init__(self, offers, journey_type, route, departure):
+        # Best offer first; at most one offer per provider (see merge_coaches)
+        self.offers = sorted(offers, key=offer_rank)
+        self.departure = departure
+        best = self.offers[0]
+        known_seats = [coach.seats for coach in self.offers if coach.seats is not None]
+        if departure is None:
+            coach_no = f"{best.source}:{best.coach_no}"
+        else:
+            coach_no = f"{departure} {normalize_name(best.company)}"
+            if normalize_name(best.coach_type):
+                coach_no += f" {normalize_name(best.coach_type)}"
+        super().__init__(MERGED_SOURCE, best.company, coach_no, route,
+                         journey_type, best.travel_date, max(known_seats) if known_seats else None, best.fare,
+                         best.departure_time, best.coach_type)
+
+    @property
+    def best(self):
+        return self.offers[0]
+
+    @property
+    def display_no(self):
+        if self.departure is None:
+            return self.best.coach_no
+        return f"{self.departure} ({' / '.join(coach.coach_no for coach in self.offers)})"
+
+    def describe_offers(self):
+        """'BusBD 5 seats 850 (best) | BDTickets 2 seats 900'"""
+        parts = []
+        for coach in self.offers:
+            part = f"{coach.source} {'?' if coach.seats is None else coach.seats} seats"
+            if coach.fare is not None:
+                part += f" {coach.fare:g}"
+            parts.append(part)
+        parts[0] += " (best)"
+        return " | ".join(parts)
+
+
+def merge_coaches(coaches):
+    """MergedCoach per physical departure in a list of Coaches from any providers"""
+    groups = {}
+    for coach in coaches:
+        minute = minutes_of_day(coach.departure_time)
+        places = route_places(coach.route)
+        if minute is None or places is None:
+            # Nothing safe to match on: keep it as a group of its own
+            key = (coach.journey_type, coach.travel_date, coach.source, coach.route, coach.coach_no)
+            route, departure = coach.route, None
+        else:
+            key = (coach.journey_type, coach.travel_date, normalize_name(coach.company), places, minute,
+                   normalize_name(coach.coach_type))
+            route, departure = "-to-".join(places), f"{minute // 60:02d}:{minute % 60:02d}"
+        group = groups.get(key)
+        if group is None:
+            groups[key] = (route, departure, [coach])
+        else:
+            group[2].append(coach)
+
+    merged = []
+    for route, departure, offers in groups.values():
+        sources = [coach.source for coach in offers]
+        if len(set(sources)) < len(sources):
+            # One provider lists several coaches that look alike: no telling which
+            # of them another provider's coach is, so none of them are merged
+            merged.extend(MergedCoach([coach], coach.journey_type, coach.route, None) for coach in offers)
+        else:
+            merged.append(MergedCoach(offers, offers[0].journey_type, route, departure))
+    return merged
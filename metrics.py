@@ -0,0 +1,187 @@
+"""Prometheus-style metrics for the monitor.
+
+Metrics are plain in-process counters, gauges and histograms; updating one
+is a dict lookup and an add under a lock, cheap enough for the hot path.
+Set METRICS_PORT to serve them in the Prometheus text format at /metrics.
+"""
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from dotenv import load_dotenv
+load_dotenv()
+
+METRICS_PORT = int(os.getenv("METRICS_PORT", "0"))
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _label_text(names, values):
+    if not names:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in zip(names, values)) + "}"
+
+
+class Metric:
+    type = None
+
+    def __init__(self, name, help_text, labels=()):
+        self.name = name
+        self.help = help_text
+        self.labels = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+        REGISTRY.append(self)
+
+    def _key(self, labels):
+        return tuple(labels.get(name, "") for name in self.labels)
+
+    def header(self):
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.type}"]
+
+
+class Counter(Metric):
+    type = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        return self._values.get(self._key(labels), 0)
+
+    def render(self):
+        with self._lock:
+            items = list(self._values.items())
+        return self.header() + [f"{self.name}{_label_text(self.labels, key)} {value:g}" for key, value in items]
+
+
+class Gauge(Metric):
+    type = "gauge"
+
+    def set(self, value, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def render(self):
+        with self._lock:
+            items = list(self._values.items())
+        return self.header() + [f"{self.name}{_label_text(self.labels, key)} {value:g}" for key, value in items]
+
+
+class AgeGauge(Gauge):
+    """Stores timestamps, exposes seconds elapsed since each one at scrape time"""
+
+    def touch(self, **labels):
+        self.set(time.time(), **labels)
+
+    def render(self):
+        now = time.time()
+        with self._lock:
+            items = list(self._values.items())
+        return self.header() + [f"{self.name}{_label_text(self.labels, key)} {now - stamp:.3f}" for key, stamp in items]
+
+
+class Histogram(Metric):
+    type = "histogram"
+
+    def __init__(self, name, help_text, labels=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, help_text, labels)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            state[0][index] += 1
+            state[1] += value
+            state[2] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def render(self):
+        with self._lock:
+            items = [(key, (list(counts), total, count)) for key, (counts, total, count) in self._values.items()]
+        lines = self.header()
+        for key, (counts, total, count) in items:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += bucket_count
+                le = "+Inf" if bound == float("inf") else f"{bound:g}"
+                lines.append(f"{self.name}_bucket{_label_text(self.labels + ('le',), key + (le,))} {cumulative}")
+            lines.append(f"{self.name}_sum{_label_text(self.labels, key)} {total:.6f}")
+            lines.append(f"{self.name}_count{_label_text(self.labels, key)} {count}")
+        return lines
+
+
+REGISTRY = []
+
+# ==================== Monitor Metrics ====================
+
+REQUEST_SECONDS = Histogram("ticket_provider_request_seconds", "Provider search request latency", ["provider"])
+REQUEST_ERRORS = Counter("ticket_provider_request_errors_total", "Failed provider requests", ["provider", "kind"])
+PARSE_SECONDS = Histogram("ticket_parse_seconds", "Time to parse one search response", ["provider"])
+COACHES_PARSED = Counter("ticket_coaches_parsed_total", "Coaches parsed from search responses", ["provider"])
+RESPONSES_UNCHANGED = Counter("ticket_responses_unchanged_total", "Responses identical to the previous one (not parsed)",
+                              ["provider"])
+DIFF_SECONDS = Histogram("ticket_diff_seconds", "Time to load, diff and record one provider's results", ["provider"])
+CYCLE_SECONDS = Histogram("ticket_cycle_seconds", "Duration of a full check cycle",
+                          buckets=(0.5, 1, 2.5, 5, 10, 30, 60, 120, 300))
+NOTIFICATIONS_SENT = Counter("ticket_notifications_total", "Notification deliveries", ["sink", "result"])
+NOTIFICATION_SECONDS = Histogram("ticket_notification_latency_seconds",
+                                 "Time from queueing a notification to delivery", ["sink"])
+DETAIL_LOOKUPS_DONE = Counter("ticket_detail_lookups_total", "Trip detail lookups for alerted coaches",
+                              ["provider", "result"])
+QUERY_SINCE_SUCCESS = AgeGauge("ticket_query_seconds_since_success", "Seconds since a query last succeeded",
+                               ["provider", "date", "route"])
+
+
+def render():
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+class MetricsHandler(BaseHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        if self.path.split("?")[0] not in ("/metrics", "/"):
+            self.send_response(404)
+            self.end_headers()
+            return
+        body = render().encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def start_metrics_server(port=METRICS_PORT, host="0.0.0.0"):
+    """Serve /metrics in a daemon thread; does nothing when port is 0"""
+    if not port:
+        return None
+    server = ThreadingHTTPServer((host, port), MetricsHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="metrics", daemon=True).start()
+    return server
@@ -0,0 +1,274 @@
+"""Background notification dispatcher.
+
+send_notification() in the monitor only puts a message on a queue. A worker
+thread drains it, merges everything that arrives within
+NOTIFY_COALESCE_SECONDS into one message, and delivers it to every
+configured sink in parallel with retries, backoff and a per-sink rate limit.
+"""
+import json
+import os
+import queue
+import smtplib
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from email.message import EmailMessage
+
+from dotenv import load_dotenv
+load_dotenv()
+
+from logger import log_message  # noqa: E402
+from metrics import NOTIFICATION_SECONDS, NOTIFICATIONS_SENT  # noqa: E402
+
+# Comma separated: pushbullet, webhook, smtp, file
+NOTIFY_SINKS = os.getenv("NOTIFY_SINKS", "pushbullet")
+NOTIFY_COALESCE_SECONDS = float(os.getenv("NOTIFY_COALESCE_SECONDS", "5"))
+NOTIFY_RETRIES = int(os.getenv("NOTIFY_RETRIES", "3"))
+NOTIFY_BACKOFF_SECONDS = float(os.getenv("NOTIFY_BACKOFF_SECONDS", "2"))
+NOTIFY_MIN_INTERVAL_SECONDS = float(os.getenv("NOTIFY_MIN_INTERVAL_SECONDS", "1"))
+
+PUSHBULLET_API_KEY = os.getenv("PUSHBULLET_API_KEY")
+WEBHOOK_URL = os.getenv("WEBHOOK_URL")
+SMTP_HOST = os.getenv("SMTP_HOST")
+SMTP_PORT = int(os.getenv("SMTP_PORT", "587"))
+SMTP_USER = os.getenv("SMTP_USER")
+SMTP_PASSWORD = os.getenv("SMTP_PASSWORD")
+SMTP_FROM = os.getenv("SMTP_FROM", SMTP_USER or "")
+SMTP_TO = os.getenv("SMTP_TO", "")
+NOTIFY_FILE = os.getenv("NOTIFY_FILE", "notifications.jsonl")
+
+
+class Sink:
+    """A notification destination. min_interval is the least time between two sends."""
+    name = "sink"
+
+    def __init__(self, min_interval=NOTIFY_MIN_INTERVAL_SECONDS):
+        self.min_interval = min_interval
+        self._last_sent = 0.0
+
+    def wait_for_slot(self):
+        delay = self._last_sent + self.min_interval - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+        self._last_sent = time.monotonic()
+
+    def send(self, title, body):
+        raise NotImplementedError
+
+    def problems(self):
+        """Missing settings that would make send() fail; checked without contacting anything"""
+        return []
+
+
+class PushbulletSink(Sink):
+    name = "pushbullet"
+
+    def __init__(self, api_key=PUSHBULLET_API_KEY, **kwargs):
+        super().__init__(**kwargs)
+        self.api_key = api_key
+        self._client = None
+
+    def problems(self):
+        return [] if self.api_key else ["PUSHBULLET_API_KEY is not set"]
+
+    def send(self, title, body):
+        # The client talks to Pushbullet when created, so build it on first use
+        if self._client is None:
+            from pushbullet import Pushbullet
+            self._client = Pushbullet(self.api_key)
+        self._client.push_note(title, body)
+
+
+class WebhookSink(Sink):
+    name = "webhook"
+
+    def __init__(self, url=WEBHOOK_URL, **kwargs):
+        super().__init__(**kwargs)
+        self.url = url
+
+    def problems(self):
+        return [] if self.url else ["WEBHOOK_URL is not set"]
+
+    def send(self, title, body):
+        from http_pool import post_json
+        response = post_json("webhook", self.url, {"title": title, "body": body})
+        response.raise_for_status()
+
+
+class SmtpSink(Sink):
+    name = "smtp"
+
+    def __init__(self, host=SMTP_HOST, port=SMTP_PORT, user=SMTP_USER, password=SMTP_PASSWORD,
+                 sender=SMTP_FROM, recipients=SMTP_TO, **kwargs):
+        super().__init__(**kwargs)
+        self.host = host
+        self.port = port
+        self.user = user
+        self.password = password
+        self.sender = sender
+        self.recipients = [r.strip() for r in recipients.split(",") if r.strip()]
+
+    def problems(self):
+        problems = []
+        if not self.host:
+            problems.append("SMTP_HOST is not set")
+        if not self.recipients:
+            problems.append("SMTP_TO is not set")
+        return problems
+
+    def send(self, title, body):
+        message = EmailMessage()
+        message["Subject"] = title
+        message["From"] = self.sender
+        message["To"] = ", ".join(self.recipients)
+        message.set_content(body)
+        with smtplib.SMTP(self.host, self.port, timeout=30) as smtp:
+            smtp.starttls()
+            if self.user:
+                smtp.login(self.user, self.password)
+            smtp.send_message(message)
+
+
+class FileSink(Sink):
+    """Appends one JSON line per message; handy for local runs and tests"""
+    name = "file"
+
+    def __init__(self, path=NOTIFY_FILE, **kwargs):
+        kwargs.setdefault("min_interval", 0)
+        super().__init__(**kwargs)
+        self.path = path
+        self._lock = threading.Lock()
+
+    def send(self, title, body):
+        line = json.dumps({"time": time.time(), "title": title, "body": body}, ensure_ascii=False)
+        with self._lock, open(self.path, "a", encoding="utf-8") as f:
+            f.write(line + "\n")
+
+
+SINK_TYPES = {
+    "pushbullet": PushbulletSink,
+    "webhook": WebhookSink,
+    "smtp": SmtpSink,
+    "file": FileSink,
+}
+
+def build_sinks(names=NOTIFY_SINKS):
+    sinks = []
+    for name in names.split(","):
+        name = name.strip().lower()
+        if not name:
+            continue
+        if name not in SINK_TYPES:
+            raise ValueError(f"Unknown notification sink: {name}")
+        sinks.append(SINK_TYPES[name]())
+    return sinks
+
+
+def coalesce(messages):
+    """Merge queued (title, body, source, queued_at) messages into one (title, body, sources, queued_at).
+
+    queued_at of the result is the oldest message's, so latency covers the whole wait.
+    """
+    queued_at = min(message[3] for message in messages)
+    if len(messages) == 1:
+        title, body, source, _ = messages[0]
+        return title, body, [source], queued_at
+    sources = sorted({message[2] for message in messages if message[2]})
+    title = f"🚌 {len(messages)} Bus Availability Updates"
+    body = "\n\n".join(f"{message[0]}\n{message[1]}" for message in messages)
+    return title, body, sources, queued_at
+
+
+class Dispatcher:
+    """Queue + background worker delivering coalesced messages to all sinks"""
+
+    def __init__(self, sinks, coalesce_seconds=NOTIFY_COALESCE_SECONDS, retries=NOTIFY_RETRIES,
+                 backoff=NOTIFY_BACKOFF_SECONDS):
+        self.sinks = sinks
+        self.coalesce_seconds = coalesce_seconds
+        self.retries = retries
+        self.backoff = backoff
+        self._queue = queue.Queue()
+        self._executor = ThreadPoolExecutor(max_workers=max(1, len(sinks)), thread_name_prefix="sink")
+        self._worker = threading.Thread(target=self._run, name="notifier", daemon=True)
+        self._worker.start()
+
+    def notify(self, title, body, source=None):
+        """Queue a message; returns immediately"""
+        self._queue.put((title, body, source, time.monotonic()))
+
+    def flush(self, timeout=None):
+        """Block until everything queued so far has been delivered (or given up on)"""
+        done = threading.Event()
+        self._queue.put(done)
+        return done.wait(timeout)
+
+    def stop(self, timeout=None):
+        self.flush(timeout)
+        self._queue.put(None)
+        self._worker.join(timeout)
+        self._executor.shutdown(wait=False)
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            if isinstance(item, threading.Event):
+                item.set()
+                continue
+
+            # Collect everything else that arrives within the coalescing window
+            batch = [item]
+            waiters = []
+            deadline = time.monotonic() + self.coalesce_seconds
+            stop = False
+            while True:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    more = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if more is None:
+                    stop = True
+                    break
+                if isinstance(more, threading.Event):
+                    # A flush: deliver what we have now rather than waiting out the window
+                    waiters.append(more)
+                    break
+                batch.append(more)
+
+            self._deliver(*coalesce(batch))
+            for waiter in waiters:
+                waiter.set()
+            if stop:
+                return
+
+    def _deliver(self, title, body, sources, queued_at):
+        futures = [self._executor.submit(self._send_with_retry, sink, title, body, sources, queued_at)
+                   for sink in self.sinks]
+        for future in futures:
+            future.result()
+
+    def _send_with_retry(self, sink, title, body, sources, queued_at):
+        source = ", ".join(sources) if sources else None
+        for attempt in range(self.retries + 1):
+            sink.wait_for_slot()
+            try:
+                sink.send(title, body)
+                NOTIFICATIONS_SENT.inc(sink=sink.name, result="sent")
+                NOTIFICATION_SECONDS.observe(time.monotonic() - queued_at, sink=sink.name)
+                log_message(f"Notification sent via {sink.name}: {title}", source)
+                return True
+            except Exception as e:
+                if attempt == self.retries:
+                    NOTIFICATIONS_SENT.inc(sink=sink.name, result="failed")
+                    log_message(f"Failed to send notification via {sink.name}: {str(e)}", source, level="error")
+                    return False
+                NOTIFICATIONS_SENT.inc(sink=sink.name, result="retried")
+                delay = self.backoff * (2 ** attempt)
+                log_message(f"Notification via {sink.name} failed ({str(e)}), retrying in {delay:g}s", source,
+                            level="warning")
+                time.sleep(delay)
@@ -0,0 +1,257 @@
+"""Ticket provider plugins.
+
+Each operator lives in its own module in this package and registers a
+Provider instance with @register_provider. A provider knows how to build
+the queries for a journey, fetch one query and parse the response into
+Coach records. Adding an operator means adding one module here and
+importing it at the bottom of this file.
+"""
+import os
+import time
+from collections import namedtuple
+
+from requests import Timeout
+
+from http_pool import post_json
+from json_stream import iter_array
+from metrics import REQUEST_ERRORS, REQUEST_SECONDS
+from resilience import ProviderUnavailable, get_guard
+
+# One search request: which provider, which journey, and the provider-specific
+# request parameters as a tuple of (key, value) pairs so queries stay hashable
+Query = namedtuple("Query", ["provider", "journey_type", "travel_date", "route", "params"])
+
+# Trip detail of one coach (see details.py); any field may be None.
+# seat_numbers are the free seats, fares the distinct seat fares
+CoachDetail = namedtuple("CoachDetail", ["departure_time", "arrival_time", "boarding", "seat_numbers", "fares"])
+
+
+class Coach:
+    """A coach found by a provider search, normalized across providers"""
+    __slots__ = ("source", "company", "coach_no", "route", "journey_type", "travel_date", "seats", "fare",
+                 "departure_time", "coach_type", "trip_id")
+
+    def __init__(self, source, company, coach_no, route, journey_type, travel_date, seats=None, fare=None,
+                 departure_time=None, coach_type=None, trip_id=None):
+        self.source = source
+        self.company = company
+        self.coach_no = coach_no
+        self.route = route
+        self.journey_type = journey_type
+        self.travel_date = travel_date
+        self.seats = seats
+        self.fare = fare
+        self.departure_time = departure_time
+        self.coach_type = coach_type
+        # The provider's id of this departure, for detail lookups
+        self.trip_id = trip_id
+
+    @property
+    def key(self):
+        """Identity of a coach departure: the same coach_no on another day or route is a different key"""
+        return (self.source, self.route, self.travel_date, self.coach_no)
+
+    @property
+    def display_no(self):
+        """Coach number as shown in alerts"""
+        return self.coach_no
+
+    def __repr__(self):
+        return (f"Coach({self.source}, {self.company}, {self.coach_no}, {self.route}, {self.travel_date}, "
+                f"seats={self.seats}, fare={self.fare})")
+
+
+def first_number(record, fields, cast=int):
+    """First of `fields` present in a provider record, converted with cast (None if missing or invalid)"""
+    for field in fields:
+        value = record.get(field)
+        if value is None or value == "":
+            continue
+        try:
+            return cast(value)
+        except (TypeError, ValueError):
+            continue
+    return None
+
+
+def first_text(record, fields):
+    """First non-empty string among `fields` of a provider record, or None"""
+    for field in fields:
+        value = record.get(field)
+        if value:
+            return str(value)
+    return None
+
+
+def parse_seat_layout(seats, number_fields, available_fields, fare_fields):
+    """(free seat numbers, sorted distinct fares) from a list of seat records"""
+    free, fares = [], set()
+    for seat in seats or []:
+        available = seat.get(next((field for field in available_fields if field in seat), None))
+        if isinstance(available, str):
+            available = available.lower() in ("available", "true", "1", "a")
+        if not available:
+            continue
+        number = first_text(seat, number_fields)
+        if number:
+            free.append(number)
+        fare = first_number(seat, fare_fields, float)
+        if fare is not None:
+            fares.add(fare)
+    return free, sorted(fares)
+
+
+def boarding_names(points, name_fields):
+    """Names of boarding points given as strings or records"""
+    names = []
+    for point in points or []:
+        name = point if isinstance(point, str) else first_text(point, name_fields)
+        if name:
+            names.append(name)
+    return names
+
+
+class Provider:
+    """Base class for provider plugins; subclasses fill in build_queries(), describe() and
+    parse_coach(), and set coaches_path when coach records aren't under "data".
+
+    Providers with a trip detail endpoint also set detail_url and the detail
+    *_fields below, and implement build_detail_payload() (see details.py).
+    """
+    name = None
+    api_url = None
+    detail_url = None
+    # Keys leading to the list of coach records in a search response
+    coaches_path = ("data",)
+
+    # Payload fields carrying seats, fare, departure time, coach type and trip id, in order of preference
+    seat_fields = ()
+    fare_fields = ()
+    departure_fields = ()
+    coach_type_fields = ()
+    trip_id_fields = ()
+
+    # Trip detail (seat layout) fields
+    arrival_fields = ()
+    boarding_fields = ()
+    seat_list_fields = ()
+    seat_number_fields = ()
+    seat_available_fields = ()
+    point_name_fields = ()
+
+    def __init__(self):
+        self.max_workers = int(os.getenv(f"{self.name.upper()}_MAX_WORKERS", "4"))
+
+    def build_queries(self, travel_date, journey_type):
+        """Return the list of Query objects to run for one journey"""
+        raise NotImplementedError
+
+    def describe(self, query):
+        """Short human label for a query, used in log lines"""
+        return query.route
+
+    def build_payload(self, query):
+        return dict(query.params)
+
+    def request(self, query, headers=None):
+        """Send one query and return the raw response (304 Not Modified is not an error).
+
+        Goes through the provider's rate limit and circuit breaker; raises
+        ProviderUnavailable without sending anything while the provider is blocked.
+        """
+        return self._post(self.api_url, self.build_payload(query), headers)
+
+    def _post(self, url, payload, headers=None):
+        guard = get_guard(self.name)
+        try:
+            guard.acquire()
+        except ProviderUnavailable:
+            REQUEST_ERRORS.inc(provider=self.name, kind="unavailable")
+            raise
+        start = time.perf_counter()
+        try:
+            response = post_json(self.name, url, payload, headers=headers)
+        except Exception as e:
+            guard.record_error()
+            REQUEST_ERRORS.inc(provider=self.name, kind="timeout" if isinstance(e, Timeout) else "connection")
+            raise
+        finally:
+            REQUEST_SECONDS.observe(time.perf_counter() - start, provider=self.name)
+        guard.record_response(response)
+        if response.status_code >= 400:
+            REQUEST_ERRORS.inc(provider=self.name, kind=f"http_{response.status_code}")
+        if response.status_code != 304:
+            response.raise_for_status()
+        return response
+
+    def fetch(self, query):
+        """Run one query and return the decoded JSON body"""
+        return self.request(query).json()
+
+    def parse_response(self, query, response, target_companies):
+        """Coaches of target companies in a search response, decoding one coach record at a time.
+
+        Each record is decoded in full; parse_coach() then drops non-target
+        companies before a Coach is built.
+        """
+        records = iter_array(response.content.decode("utf-8-sig"), self.coaches_path)
+        return self._coaches(query, records, target_companies)
+
+    def parse(self, query, data, target_companies):
+        """Coaches of target companies in an already decoded response"""
+        records = data
+        for key in self.coaches_path:
+            records = records.get(key) if isinstance(records, dict) else None
+        return self._coaches(query, records or [], target_companies)
+
+    def _coaches(self, query, records, target_companies):
+        coaches = []
+        for record in records:
+            coach = self.parse_coach(query, record, target_companies)
+            if coach is not None:
+                coaches.append(coach)
+        return coaches
+
+    def parse_coach(self, query, record, target_companies):
+        """One coach record as a Coach, or None when its company isn't a target"""
+        raise NotImplementedError
+
+    def fetch_detail(self, coach):
+        """Fetch and parse the trip detail of one coach (same rate limit and breaker as searches)"""
+        response = self._post(self.detail_url, self.build_detail_payload(coach))
+        return self.parse_detail(coach, response.json())
+
+    def build_detail_payload(self, coach):
+        raise NotImplementedError
+
+    def parse_detail(self, coach, data):
+        """Turn a decoded detail response into a CoachDetail"""
+        trip = data.get("data") or {}
+        seats = next((trip[field] for field in self.seat_list_fields if trip.get(field)), [])
+        seat_numbers, fares = parse_seat_layout(seats, self.seat_number_fields, self.seat_available_fields,
+                                                self.fare_fields)
+        boarding = next((trip[field] for field in self.boarding_fields if trip.get(field)), [])
+        return CoachDetail(first_text(trip, self.departure_fields), first_text(trip, self.arrival_fields),
+                           boarding_names(boarding, self.point_name_fields), seat_numbers if seats else None, fares)
+
+
+PROVIDERS = {}
+
+def register_provider(cls):
+    provider = cls()
+    PROVIDERS[provider.name] = provider
+    return cls
+
+def get_provider(name):
+    return PROVIDERS[name]
+
+def get_providers(names=None):
+    """Registered providers, optionally limited to a list of names (case-insensitive)"""
+    wanted = {name.strip().lower() for name in names or [] if name.strip()}
+    if not wanted:
+        return list(PROVIDERS.values())
+    return [provider for provider in PROVIDERS.values() if provider.name.lower() in wanted]
+
+
+# Import plugins so they register themselves
+from providers import bdtickets, busbd  # noqa: E402,F401
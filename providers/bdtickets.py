@@ -0,0 +1,50 @@
+import os
+
+from providers import Coach, Provider, Query, first_number, first_text, register_provider
+
+ONWARD_ROUTES = ["dhaka-to-rajshahi", "dhaka-to-chapainawabganj"]
+RETURN_ROUTES = ["rajshahi-to-dhaka", "chapainawabganj-to-dhaka"]
+
+
+@register_provider
+class BDTickets(Provider):
+    name = "BDTickets"
+    api_url = "https://api.bdtickets.com:20102/v1/coaches/search"
+    # Seat layout endpoint for a trip id; unset = no detail lookups
+    detail_url = os.getenv("BDTICKETS_DETAIL_URL", "")
+
+    # Payload fields carrying seats, fare, departure time, coach type and trip id, in order of preference
+    seat_fields = ("availableSeats", "totalAvailableSeats", "seatAvailable")
+    fare_fields = ("fare", "minFare", "seatFare")
+    departure_fields = ("departureTime", "departure_time", "journeyTime")
+    coach_type_fields = ("coachType", "coach_type", "busType")
+    trip_id_fields = ("tripId", "trip_id", "id")
+
+    # Trip detail (seat layout) fields
+    arrival_fields = ("arrivalTime", "arrival_time")
+    boarding_fields = ("boardingPoints", "boarding_points")
+    seat_list_fields = ("seats", "seatLayout")
+    seat_number_fields = ("seatNo", "seatNumber", "seat_no")
+    seat_available_fields = ("isAvailable", "available", "status")
+    point_name_fields = ("name", "pointName", "counterName")
+
+    def build_queries(self, travel_date, journey_type):
+        routes = ONWARD_ROUTES if journey_type == "Onward" else RETURN_ROUTES
+        return [
+            Query(self.name, journey_type, travel_date, route,
+                  (("date", travel_date), ("identifier", route), ("structureType", "BUS")))
+            for route in routes
+        ]
+
+    def parse_coach(self, query, coach, target_companies):
+        company_name = coach.get("companyName", "")
+        if company_name not in target_companies:
+            return None
+        return Coach(self.name, company_name, coach.get("coachNo", ""),
+                     query.route, query.journey_type, query.travel_date,
+                     first_number(coach, self.seat_fields), first_number(coach, self.fare_fields, float),
+                     first_text(coach, self.departure_fields), first_text(coach, self.coach_type_fields),
+                     first_text(coach, self.trip_id_fields))
+
+    def build_detail_payload(self, coach):
+        return {"tripId": coach.trip_id, "date": coach.travel_date}
@@ -0,0 +1,61 @@
+import os
+
+from providers import Coach, Provider, Query, first_number, first_text, register_provider
+
+# Bus stop IDs
+DHAKA_ID = 14
+RAJSHAHI_ID = 55
+CHAPAI_ID = 9
+
+ONWARD_STOPS = ([DHAKA_ID], [RAJSHAHI_ID, CHAPAI_ID])
+RETURN_STOPS = ([RAJSHAHI_ID, CHAPAI_ID], [DHAKA_ID])
+
+
+@register_provider
+class BusBD(Provider):
+    name = "BusBD"
+    api_url = "https://api.busbd.com.bd/api/v2/searchlist"
+    coaches_path = ("data", "coaches")
+    # Seat layout endpoint for a trip id; unset = no detail lookups
+    detail_url = os.getenv("BUSBD_DETAIL_URL", "")
+
+    # Payload fields carrying seats, fare, departure time, coach type and trip id, in order of preference
+    seat_fields = ("available_seats", "total_available_seats", "seat_available")
+    fare_fields = ("fare", "min_fare", "seat_fare")
+    departure_fields = ("departure_time", "departureTime", "dep_time")
+    coach_type_fields = ("coach_type", "coachType", "bus_type")
+    trip_id_fields = ("trip_id", "schedule_id", "id")
+
+    # Trip detail (seat layout) fields
+    arrival_fields = ("arrival_time", "arrivalTime")
+    boarding_fields = ("boarding_points", "boardingPoints")
+    seat_list_fields = ("seats", "seat_layout")
+    seat_number_fields = ("seat_no", "seat_number", "seatNo")
+    seat_available_fields = ("is_available", "available", "status")
+    point_name_fields = ("name", "point_name", "counter_name")
+
+    def build_queries(self, travel_date, journey_type):
+        from_ids, to_ids = ONWARD_STOPS if journey_type == "Onward" else RETURN_STOPS
+        return [
+            Query(self.name, journey_type, travel_date, f"{from_id}->{to_id}",
+                  (("jrdate", travel_date), ("fromid", from_id), ("toid", to_id), ("coach_type", None)))
+            for from_id in from_ids
+            for to_id in to_ids
+        ]
+
+    def describe(self, query):
+        params = dict(query.params)
+        return f"from_id: {params['fromid']} -> to_id: {params['toid']}"
+
+    def parse_coach(self, query, coach, target_companies):
+        company_name = coach.get("company_name", "")
+        if company_name not in target_companies:
+            return None
+        return Coach(self.name, company_name, coach.get("coach_no", ""),
+                     coach.get("route_name", ""), query.journey_type, query.travel_date,
+                     first_number(coach, self.seat_fields), first_number(coach, self.fare_fields, float),
+                     first_text(coach, self.departure_fields), first_text(coach, self.coach_type_fields),
+                     first_text(coach, self.trip_id_fields))
+
+    def build_detail_payload(self, coach):
+        return {"trip_id": coach.trip_id, "jrdate": coach.travel_date}
@@ -0,0 +1,156 @@
+"""Burst polling around learned seat-release windows.
+
+Operators tend to release seats at set times, e.g. 08:00 ten days before
+departure. ReleaseWindows learns those times per provider, route and
+company from the availability history (history.py): the slots of the day
+that hold most of a company's releases, and the days before departure they
+fall on. Inside a window a query is polled every BURST_POLL_SECONDS; outside
+its interval is stretched so the total number of requests stays what the
+plain interval would have made, but never past the start of the next window.
+"""
+import os
+import time
+from collections import Counter
+from datetime import date, datetime
+
+from dotenv import load_dotenv
+load_dotenv()
+
+from history import HISTORY_DIR, open_partitions, releases  # noqa: E402
+from logger import log_message  # noqa: E402
+
+RELEASE_WINDOWS = os.getenv("RELEASE_WINDOWS", "False").lower() == "true"
+BURST_POLL_SECONDS = float(os.getenv("BURST_POLL_SECONDS", "30"))
+# Releases a time slot (or day before departure) needs before it counts as a window
+RELEASE_MIN_EVENTS = int(os.getenv("RELEASE_MIN_EVENTS", "3"))
+RELEASE_SLOT_MINUTES = 15
+SLOTS_PER_DAY = 24 * 60 // RELEASE_SLOT_MINUTES
+# Windows cover the busiest slots holding this share of a company's releases
+RELEASE_WINDOW_SHARE = 0.6
+RELEASE_RELEARN_SECONDS = 6 * 3600
+
+
+def slot_of(moment):
+    local = datetime.fromtimestamp(moment)
+    return (local.hour * 60 + local.minute) // RELEASE_SLOT_MINUTES
+
+
+def days_before(travel_date, moment):
+    try:
+        return (date.fromisoformat(travel_date) - datetime.fromtimestamp(moment).date()).days
+    except (TypeError, ValueError):
+        return None
+
+
+def _busiest(counts, min_events, share):
+    """The most frequent values holding `share` of all events, each seen at least min_events times"""
+    total = sum(counts.values())
+    chosen, covered = set(), 0
+    for value, count in counts.most_common():
+        if count < min_events or covered >= share * total:
+            break
+        chosen.add(value)
+        covered += count
+    return chosen
+
+
+class ReleaseWindows:
+    """Learned release windows, keyed by (provider, route)"""
+
+    def __init__(self, min_events=RELEASE_MIN_EVENTS, burst_seconds=BURST_POLL_SECONDS):
+        self.min_events = min_events
+        self.burst_seconds = burst_seconds
+        self.learned_at = None
+        self._windows = {}   # (provider, route) -> [(company, slots, days before departure or None)]
+        self._shares = {}    # (provider, route) -> fraction of the day inside a window
+
+    def learn(self, partitions, rules=None, now=None):
+        """Rebuild the windows from history, only counting companies the rules watch"""
+        slot_counts, day_counts = {}, {}
+        for when, provider, route, travel_date, company in releases(partitions):
+            if rules is not None and company not in rules:
+                continue
+            key = (provider, route, company)
+            slot_counts.setdefault(key, Counter())[slot_of(when)] += 1
+            days = days_before(travel_date, when)
+            if days is not None:
+                day_counts.setdefault(key, Counter())[days] += 1
+
+        windows = {}
+        for (provider, route, company), counts in slot_counts.items():
+            busy = _busiest(counts, self.min_events, RELEASE_WINDOW_SHARE)
+            if not busy:
+                continue
+            # A release is only seen at the poll after it, so start each window a slot early
+            slots = frozenset(slot for busy_slot in busy for slot in (busy_slot, (busy_slot - 1) % SLOTS_PER_DAY))
+            days = _busiest(day_counts.get((provider, route, company), Counter()),
+                            self.min_events, RELEASE_WINDOW_SHARE)
+            windows.setdefault((provider, route), []).append((company, slots, frozenset(days) or None))
+
+        self._windows = windows
+        self._shares = {key: len(frozenset().union(*(slots for _, slots, _ in entries))) / SLOTS_PER_DAY
+                        for key, entries in windows.items()}
+        self.learned_at = time.time() if now is None else now
+        return sum(len(entries) for entries in windows.values())
+
+    def __len__(self):
+        return len(self._windows)
+
+    def describe(self):
+        """(provider, route, company, 'HH:MM-HH:MM, ...', days before departure or None) per window"""
+        for (provider, route), entries in sorted(self._windows.items()):
+            for company, slots, days in entries:
+                yield provider, route, company, _format_slots(slots), sorted(days) if days else None
+
+    def inside(self, provider, route, travel_date, moment):
+        slot = slot_of(moment)
+        days = days_before(travel_date, moment)
+        return any(slot in slots and (window_days is None or days in window_days)
+                   for _, slots, window_days in self._windows.get((provider, route), ()))
+
+    def next_start(self, provider, route, travel_date, now, horizon):
+        """Start of the next window within horizon seconds of now, or None"""
+        step = RELEASE_SLOT_MINUTES * 60
+        boundary = (now // step + 1) * step
+        while boundary - now <= horizon:
+            if self.inside(provider, route, travel_date, boundary):
+                return boundary
+            boundary += step
+        return None
+
+    def interval(self, provider, route, travel_date, base, now=None):
+        """Seconds until the next poll of a query whose plain interval is `base`"""
+        key = (provider, route)
+        if key not in self._windows:
+            return base
+        now = time.time() if now is None else now
+        share = self._shares[key]
+        # Bursts may use at most half the request budget; the rest is spread outside the windows
+        burst = max(self.burst_seconds, 2 * share * base)
+        if self.inside(provider, route, travel_date, now):
+            return min(base, burst)
+        backoff = base * (1 - share) / (1 - share * base / burst)
+        start = self.next_start(provider, route, travel_date, now, backoff)
+        return backoff if start is None else max(1.0, start - now)
+
+
+def _format_slots(slots):
+    """Contiguous slot runs as 'HH:MM-HH:MM'"""
+    runs, ordered = [], sorted(slots)
+    for slot in ordered:
+        if runs and slot == runs[-1][1] + 1:
+            runs[-1][1] = slot
+        else:
+            runs.append([slot, slot])
+
+    def clock(slot):
+        minutes = slot * RELEASE_SLOT_MINUTES % (24 * 60)
+        return f"{minutes // 60:02d}:{minutes % 60:02d}"
+    return ", ".join(f"{clock(first)}-{clock(last + 1)}" for first, last in runs)
+
+
+def learn_windows(windows, rules=None, directory=HISTORY_DIR):
+    """Relearn windows from HISTORY_DIR and log what was found"""
+    learned = windows.learn(open_partitions(directory), rules)
+    log_message(f"Release windows: {learned} learned for {len(windows)} routes from {directory or 'no history'}")
+    return learned
@@ -0,0 +1,184 @@
+"""Per-provider request budget and circuit breaker.
+
+Every provider request first takes a token from the provider's bucket
+(<NAME>_RATE_PER_SECOND, burst <NAME>_BURST) and checks its breaker. After
+BREAKER_FAILURE_THRESHOLD consecutive failures the breaker opens and
+requests fail fast for BREAKER_RESET_SECONDS; then one probe is let through
+(half-open) and its result decides whether to close or re-open. A 429/503
+with Retry-After blocks the provider until that time.
+"""
+import os
+import threading
+import time
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+
+from dotenv import load_dotenv
+load_dotenv()
+
+BREAKER_FAILURE_THRESHOLD = int(os.getenv("BREAKER_FAILURE_THRESHOLD", "5"))
+BREAKER_RESET_SECONDS = float(os.getenv("BREAKER_RESET_SECONDS", "60"))
+# Longest a request waits for a rate-limit token before giving up
+RATE_LIMIT_MAX_WAIT = float(os.getenv("RATE_LIMIT_MAX_WAIT", "30"))
+# Cap on how long we honour a Retry-After header
+MAX_RETRY_AFTER_SECONDS = float(os.getenv("MAX_RETRY_AFTER_SECONDS", "900"))
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class ProviderUnavailable(Exception):
+    """Raised instead of sending a request when the provider is blocked or over budget"""
+
+
+class TokenBucket:
+    def __init__(self, rate, burst, clock=time.monotonic):
+        self.rate = rate
+        self.capacity = max(1.0, burst)
+        self.tokens = self.capacity
+        self.clock = clock
+        self.updated = clock()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = self.clock()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def reserve(self):
+        """Take a token now or book the next one; returns seconds to wait before using it"""
+        with self._lock:
+            if self.rate <= 0:
+                return 0.0
+            self._refill()
+            self.tokens -= 1
+            if self.tokens >= 0:
+                return 0.0
+            return -self.tokens / self.rate
+
+    def cancel(self):
+        with self._lock:
+            self.tokens = min(self.capacity, self.tokens + 1)
+
+
+class CircuitBreaker:
+    def __init__(self, failure_threshold=BREAKER_FAILURE_THRESHOLD, reset_timeout=BREAKER_RESET_SECONDS,
+                 clock=time.monotonic):
+        self.failure_threshold = max(1, failure_threshold)
+        self.reset_timeout = reset_timeout
+        self.clock = clock
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self.blocked_until = 0.0
+        self._probe_in_flight = False
+        self._lock = threading.Lock()
+
+    def allow(self):
+        """True if a request may go out now"""
+        with self._lock:
+            now = self.clock()
+            if now < self.blocked_until:
+                return False
+            if self.state == CLOSED:
+                return True
+            if self.state == OPEN and now - self.opened_at >= self.reset_timeout:
+                self.state = HALF_OPEN
+                self._probe_in_flight = False
+            if self.state == HALF_OPEN and not self._probe_in_flight:
+                self._probe_in_flight = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.state = CLOSED
+            self.failures = 0
+            self._probe_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self._probe_in_flight = False
+            if self.state == HALF_OPEN or self.failures >= self.failure_threshold:
+                self.state = OPEN
+                self.opened_at = self.clock()
+
+    def release_probe(self):
+        """Give back a half-open probe slot that was granted but not used"""
+        with self._lock:
+            self._probe_in_flight = False
+
+    def block_for(self, seconds):
+        with self._lock:
+            self.blocked_until = max(self.blocked_until, self.clock() + seconds)
+
+
+def parse_retry_after(value, now=None):
+    """Seconds to wait from a Retry-After header (delta-seconds or HTTP date), or None"""
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        when = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if when.tzinfo is None:
+        # "-0000" parses as a naive datetime; HTTP dates are always UTC
+        when = when.replace(tzinfo=timezone.utc)
+    now = now or datetime.now(timezone.utc)
+    return max(0.0, (when - now).total_seconds())
+
+
+class ProviderGuard:
+    """Rate limit + circuit breaker for one provider"""
+
+    def __init__(self, name, rate, burst):
+        self.name = name
+        self.bucket = TokenBucket(rate, burst)
+        self.breaker = CircuitBreaker()
+
+    def acquire(self):
+        if not self.breaker.allow():
+            raise ProviderUnavailable(f"{self.name} circuit {self.breaker.state}, skipping request")
+        wait = self.bucket.reserve()
+        if wait > RATE_LIMIT_MAX_WAIT:
+            self.bucket.cancel()
+            self.breaker.release_probe()
+            raise ProviderUnavailable(f"{self.name} request budget exhausted ({wait:.0f}s wait)")
+        if wait > 0:
+            time.sleep(wait)
+
+    def record_response(self, response):
+        if response.status_code in (429, 503):
+            retry_after = parse_retry_after(response.headers.get("Retry-After"))
+            if retry_after:
+                self.breaker.block_for(min(retry_after, MAX_RETRY_AFTER_SECONDS))
+            self.breaker.record_failure()
+        elif response.status_code >= 500:
+            self.breaker.record_failure()
+        else:
+            self.breaker.record_success()
+
+    def record_error(self):
+        self.breaker.record_failure()
+
+
+_guards = {}
+_guards_lock = threading.Lock()
+
+def get_guard(provider):
+    guard = _guards.get(provider)
+    if guard is None:
+        with _guards_lock:
+            guard = _guards.get(provider)
+            if guard is None:
+                prefix = provider.upper()
+                guard = ProviderGuard(provider,
+                                      float(os.getenv(f"{prefix}_RATE_PER_SECOND", "5")),
+                                      float(os.getenv(f"{prefix}_BURST", "10")))
+                _guards[provider] = guard
+    return guard
@@ -0,0 +1,199 @@
+"""Watch rules: which coaches are worth alerting on.
+
+Rules live in a JSON file (WATCH_RULES_FILE) and are compiled once into a
+WatchRules object. A coach is kept if any rule matches; every field of a
+rule is optional:
+
+    {"rules": [
+        {"companies": ["Hanif Enterprise", "Shyamoli N.R Travels"],
+         "providers": ["BDTickets"], "routes": ["dhaka-to-rajshahi"],
+         "departure": ["06:00", "11:30"], "max_fare": 1200, "min_fare": 0,
+         "min_seats": 2, "coach_types": ["AC"]}
+    ]}
+
+Company names and coach types are normalized (case, spaces and punctuation
+dropped), so "Shyamoli N.R Travels" and "Shyamoli NR Travels" are one name.
+Providers check `company in rules` while parsing, a single set lookup, and
+only rules with other constraints look at the parsed coach. The file is
+re-read when it changes; a broken edit is logged and the last good rules
+stay in force.
+"""
+import json
+import os
+import re
+import threading
+import time
+from functools import lru_cache
+
+from dotenv import load_dotenv
+load_dotenv()
+
+from logger import log_message  # noqa: E402
+
+WATCH_RULES_FILE = os.getenv("WATCH_RULES_FILE", "watch_rules.json")
+# How often to look at the rule file's modification time
+WATCH_RULES_CHECK_SECONDS = float(os.getenv("WATCH_RULES_CHECK_SECONDS", "10"))
+
+# Used when there is no rule file
+DEFAULT_COMPANIES = [
+    "National Travels", "Desh Travels", "Grameen Travels",
+    "KTC Hanif", "Hanif Enterprise", "Shyamoli N.R Travels",
+]
+DEFAULT_RULES = {"rules": [{"companies": DEFAULT_COMPANIES}]}
+
+RULE_FIELDS = {"companies", "providers", "routes", "departure", "min_fare", "max_fare", "min_seats", "coach_types"}
+
+_TIME = re.compile(r"(\d{1,2}):(\d{2})(?::\d{2})?\s*([AaPp][Mm])?")
+
+
+@lru_cache(maxsize=4096)
+def normalize_name(name):
+    """Comparable form of a company name or coach type: lower case letters and digits only"""
+    return re.sub(r"[^0-9a-z]", "", (name or "").casefold())
+
+
+@lru_cache(maxsize=4096)
+def minutes_of_day(value):
+    """Minutes after midnight for '06:30', '6:30 PM' or '2026-03-04T18:30:00', else None"""
+    match = _TIME.search(value or "")
+    if not match:
+        return None
+    hours, minutes, half = int(match.group(1)), int(match.group(2)), match.group(3)
+    if half:
+        hours = hours % 12 + (12 if half.lower() == "pm" else 0)
+    return hours * 60 + minutes
+
+
+def _compile_rule(rule):
+    """One rule as (normalized companies or None, predicate on a Coach or None)"""
+    if not isinstance(rule, dict):
+        raise ValueError("each rule must be an object")
+    unknown = set(rule) - RULE_FIELDS
+    if unknown:
+        raise ValueError(f"unknown rule fields: {', '.join(sorted(unknown))}")
+
+    companies = frozenset(normalize_name(name) for name in rule["companies"]) if rule.get("companies") else None
+    checks = []
+    if rule.get("providers"):
+        providers = frozenset(rule["providers"])
+        checks.append(lambda coach: coach.source in providers)
+    if rule.get("routes"):
+        routes = frozenset(rule["routes"])
+        checks.append(lambda coach: coach.route in routes)
+    if rule.get("coach_types"):
+        coach_types = frozenset(normalize_name(name) for name in rule["coach_types"])
+        checks.append(lambda coach: normalize_name(coach.coach_type) in coach_types)
+    if rule.get("departure"):
+        start, end = (minutes_of_day(value) for value in rule["departure"])
+        if start is None or end is None:
+            raise ValueError(f"departure must be two times like [\"06:00\", \"12:00\"], got {rule['departure']}")
+        if start <= end:
+            inside = lambda minute: start <= minute <= end  # noqa: E731
+        else:
+            # Window over midnight, e.g. ["22:00", "02:00"]
+            inside = lambda minute: minute >= start or minute <= end  # noqa: E731
+
+        def departs_in_window(coach):
+            minute = minutes_of_day(coach.departure_time)
+            return minute is None or inside(minute)
+        checks.append(departs_in_window)
+    # Unknown departure, fare or seat counts pass: better a spare alert than a missed coach.
+    # Sold-out coaches pass min_seats too, so the diff still sees them sell out and reopen.
+    if rule.get("min_fare") is not None:
+        min_fare = float(rule["min_fare"])
+        checks.append(lambda coach: coach.fare is None or coach.fare >= min_fare)
+    if rule.get("max_fare") is not None:
+        max_fare = float(rule["max_fare"])
+        checks.append(lambda coach: coach.fare is None or coach.fare <= max_fare)
+    if rule.get("min_seats") is not None:
+        min_seats = int(rule["min_seats"])
+        checks.append(lambda coach: coach.seats is None or coach.seats == 0 or coach.seats >= min_seats)
+
+    if not checks:
+        return companies, None
+    if len(checks) == 1:
+        return companies, checks[0]
+    return companies, lambda coach: all(check(coach) for check in checks)
+
+
+class WatchRules:
+    """Compiled rules; `company in rules` is the parse-time prefilter, select() the full check"""
+
+    def __init__(self, compiled):
+        self._rules = compiled
+        any_company = any(companies is None for companies, _ in compiled)
+        self.companies = None if any_company else frozenset().union(*(c for c, _ in compiled))
+        # Only company names to check: the prefilter already decided everything
+        self._company_only = all(predicate is None for _, predicate in compiled)
+
+    def __contains__(self, company):
+        return self.companies is None or normalize_name(company) in self.companies
+
+    def matches(self, coach):
+        company = normalize_name(coach.company)
+        for companies, predicate in self._rules:
+            if (companies is None or company in companies) and (predicate is None or predicate(coach)):
+                return True
+        return False
+
+    def select(self, coaches):
+        """The coaches that match at least one rule"""
+        if self._company_only:
+            return coaches
+        return [coach for coach in coaches if self.matches(coach)]
+
+
+def compile_rules(data):
+    """WatchRules from the parsed rule file ({"rules": [...]} or a bare list)"""
+    rules = data.get("rules") if isinstance(data, dict) else data
+    if not isinstance(rules, list) or not rules:
+        raise ValueError("rule file must contain a non-empty \"rules\" list")
+    return WatchRules([_compile_rule(rule) for rule in rules])
+
+
+class RuleLoader:
+    """Current WatchRules from a file, recompiled when the file changes"""
+
+    def __init__(self, path=WATCH_RULES_FILE, check_seconds=WATCH_RULES_CHECK_SECONDS):
+        self.path = path
+        self.check_seconds = check_seconds
+        self.version = 0
+        self._mtime = None
+        self._checked = 0.0
+        self._lock = threading.Lock()
+        self._rules = self._load(initial=True)
+
+    def _load(self, initial=False):
+        try:
+            mtime = os.path.getmtime(self.path)
+        except OSError:
+            mtime = None
+        if not initial and mtime == self._mtime:
+            return self._rules
+        self._mtime = mtime
+        if mtime is None:
+            if not initial:
+                log_message(f"Watch rules {self.path} removed, using the default company list")
+            rules = compile_rules(DEFAULT_RULES)
+        else:
+            try:
+                with open(self.path, "r", encoding="utf-8") as f:
+                    rules = compile_rules(json.load(f))
+            except (ValueError, TypeError, KeyError) as e:
+                if initial:
+                    raise ValueError(f"Invalid watch rules in {self.path}: {e}")
+                log_message(f"Invalid watch rules in {self.path}, keeping the previous ones: {e}", level="error")
+                return self._rules
+            if not initial:
+                log_message(f"Reloaded watch rules from {self.path}")
+        self.version += 1
+        return rules
+
+    def current(self):
+        now = time.monotonic()
+        if now - self._checked >= self.check_seconds:
+            with self._lock:
+                if now - self._checked >= self.check_seconds:
+                    self._checked = now
+                    self._rules = self._load()
+        return self._rules
@@ -0,0 +1,154 @@
+import heapq
+import os
+import random
+import time
+from collections import deque
+from datetime import date
+
+from dotenv import load_dotenv
+load_dotenv()
+
+# Per-query polling bounds and shape (seconds unless noted)
+MIN_POLL_SECONDS = int(os.getenv("MIN_POLL_SECONDS", "60"))
+MAX_POLL_SECONDS = int(os.getenv("MAX_POLL_SECONDS", "1800"))
+POLL_JITTER = float(os.getenv("POLL_JITTER", "0.1"))
+# Departures this many days away (or more) are polled at the slow end of the range
+FAR_DEPARTURE_DAYS = int(os.getenv("FAR_DEPARTURE_DAYS", "30"))
+# How many recent polls count towards a query's change rate
+CHANGE_HISTORY = 10
+
+
+class QueryScheduler:
+    """Priority queue of per-query deadlines.
+
+    Each item (any hashable, usually a (provider, query) pair) gets its own
+    interval: short when departure is close or its results keep changing,
+    long when departure is far away or nothing has changed for a while.
+    With release windows (see release_windows.py) items added with a
+    window key are polled in bursts inside their windows and less outside.
+    """
+
+    def __init__(self, min_interval=MIN_POLL_SECONDS, max_interval=MAX_POLL_SECONDS,
+                 jitter=POLL_JITTER, far_days=FAR_DEPARTURE_DAYS, clock=time.time, rng=random, windows=None):
+        self.min_interval = min_interval
+        self.max_interval = max(min_interval, max_interval)
+        self.jitter = jitter
+        self.far_days = max(1, far_days)
+        self.clock = clock
+        self.rng = rng
+        self.windows = windows
+        self._heap = []
+        self._seq = 0
+        self._deadlines = {}
+        self._travel_dates = {}
+        self._signatures = {}
+        self._history = {}
+        self._window_keys = {}
+
+    def __len__(self):
+        return len(self._deadlines)
+
+    def __contains__(self, item):
+        return item in self._deadlines
+
+    def _push(self, item, deadline):
+        self._seq += 1
+        self._deadlines[item] = deadline
+        heapq.heappush(self._heap, (deadline, self._seq, item))
+
+    def add(self, item, travel_date, due=None, window_key=None):
+        """Start tracking item; it is due immediately unless a deadline is given.
+
+        window_key is the (provider, route) whose release windows apply to item.
+        Items whose travel date has already passed are not added.
+        """
+        if self._departed(travel_date, self.clock()):
+            return
+        self._travel_dates[item] = travel_date
+        if window_key:
+            self._window_keys[item] = window_key
+        self._history.setdefault(item, deque(maxlen=CHANGE_HISTORY))
+        self._push(item, self.clock() if due is None else due)
+
+    def remove(self, item):
+        # Heap entries are dropped lazily when they surface
+        self._deadlines.pop(item, None)
+        self._travel_dates.pop(item, None)
+        self._signatures.pop(item, None)
+        self._history.pop(item, None)
+        self._window_keys.pop(item, None)
+
+    def next_deadline(self):
+        while self._heap:
+            deadline, _, item = self._heap[0]
+            if self._deadlines.get(item) == deadline:
+                return deadline
+            heapq.heappop(self._heap)
+        return None
+
+    def pop_due(self, now=None):
+        """Remove and return every item whose deadline has passed"""
+        now = self.clock() if now is None else now
+        due = []
+        while self._heap and self._heap[0][0] <= now:
+            deadline, _, item = heapq.heappop(self._heap)
+            if self._deadlines.get(item) == deadline:
+                del self._deadlines[item]
+                due.append(item)
+        return due
+
+    def last_signature(self, item):
+        return self._signatures.get(item)
+
+    def change_rate(self, item):
+        history = self._history.get(item)
+        if not history:
+            return 0.5
+        return sum(history) / len(history)
+
+    def interval(self, item, today=None):
+        """Seconds until item should be polled again (before jitter)"""
+        today = today or date.today()
+        try:
+            days_left = (date.fromisoformat(self._travel_dates[item]) - today).days
+        except (KeyError, TypeError, ValueError):
+            days_left = self.far_days
+        proximity = min(max(days_left, 0), self.far_days) / self.far_days
+        base = self.min_interval + (self.max_interval - self.min_interval) * proximity
+
+        # Results changing on every poll halve the interval; never changing stretches it by half
+        base *= 1.5 - self.change_rate(item)
+        return min(max(base, self.min_interval), self.max_interval)
+
+    def _departed(self, travel_date, now):
+        try:
+            return date.fromisoformat(travel_date) < date.fromtimestamp(now)
+        except (TypeError, ValueError):
+            return False
+
+    def record(self, item, signature, now=None):
+        """Record a poll result for item and schedule its next poll. Returns True if it changed.
+
+        Once its travel date has passed the item is dropped instead of rescheduled.
+        """
+        if item not in self._travel_dates:
+            return False
+        now = self.clock() if now is None else now
+
+        previous = self._signatures.get(item)
+        changed = previous is not None and previous != signature
+        self._signatures[item] = signature
+        self._history[item].append(1 if changed else 0)
+        if self._departed(self._travel_dates[item], now):
+            self.remove(item)
+            return changed
+
+        interval = self.interval(item)
+        if self.jitter:
+            interval *= 1 + self.rng.uniform(-self.jitter, self.jitter)
+        interval = max(self.min_interval * (1 - self.jitter), interval)
+        window_key = self._window_keys.get(item)
+        if self.windows is not None and window_key:
+            interval = self.windows.interval(*window_key, self._travel_dates[item], interval, now)
+        self._push(item, now + interval)
+        return changed
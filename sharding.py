@@ -0,0 +1,311 @@
+"""Split the watch list between several monitor processes or hosts.
+
+With SHARDING=True every worker registers itself in a lease store and
+leases its share of the watched queries. Each cycle a worker renews its
+leases, drops the ones above its fair share (total queries / live workers,
+rounded up) and takes free or expired ones up to that share. A worker that
+stops renewing loses its leases after SHARD_LEASE_SECONDS and the others
+pick them up, so no query is polled or alerted twice while its lease is held.
+
+Workers on one host share the leases through STATE_DB (ShardCoordinator).
+SQLite's locking only works between processes on the same machine, so
+workers on separate hosts (several Render workers) talk to one shard server
+instead (`cli.py shard-server`, SHARD_SERVER_URL; RemoteShardCoordinator).
+The server keeps the leases and the per-query alert history in its own
+STATE_DB, so a query that moves between hosts is not alerted again.
+"""
+import json
+import math
+import os
+import socket
+import sqlite3
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from dotenv import load_dotenv
+load_dotenv()
+
+from diff import Snapshot  # noqa: E402
+from http_pool import post_json  # noqa: E402
+from logger import log_message  # noqa: E402
+from providers import Coach  # noqa: E402
+from state_store import STATE_DB, StateStore  # noqa: E402
+
+SHARDING = os.getenv("SHARDING", "False").lower() == "true"
+WORKER_ID = os.getenv("WORKER_ID") or f"{socket.gethostname()}-{os.getpid()}"
+# 0 = three check intervals (worked out by the monitor)
+SHARD_LEASE_SECONDS = float(os.getenv("SHARD_LEASE_SECONDS", "0"))
+# Shard server for workers on several hosts; unset = share STATE_DB on one host
+SHARD_SERVER_URL = os.getenv("SHARD_SERVER_URL", "").rstrip("/")
+SHARD_SERVER_HOST = os.getenv("SHARD_SERVER_HOST", "127.0.0.1")
+SHARD_SERVER_PORT = int(os.getenv("SHARD_SERVER_PORT", "8766"))
+SHARD_TOKEN = os.getenv("SHARD_TOKEN", "")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS shard_workers (
+    worker_id TEXT PRIMARY KEY,
+    heartbeat REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS shard_leases (
+    query_key  TEXT PRIMARY KEY,
+    worker_id  TEXT NOT NULL,
+    expires_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_shard_leases_worker ON shard_leases (worker_id);
+"""
+
+
+def query_key(query):
+    return f"{query.provider}|{query.journey_type}|{query.travel_date}|{query.route}"
+
+
+class ShardCoordinator:
+    """Leases this worker's part of the watch list in the shared database"""
+    # Sharded alert history lives in the monitor's own state store
+    alert_store = None
+
+    def __init__(self, lease_seconds, path=STATE_DB, worker_id=WORKER_ID):
+        self.lease_seconds = lease_seconds
+        self.worker_id = worker_id
+        self.live_workers = 0
+        self._lock = threading.Lock()
+        # Other workers hold write locks briefly; wait for them rather than fail
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(SCHEMA)
+
+    def _transaction(self, func, *args):
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                result = func(*args)
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._conn.execute("COMMIT")
+            return result
+
+    def claim(self, watch_queries, now=None):
+        """Renew and rebalance this worker's leases; returns the (provider, query) pairs it owns"""
+        by_key = {query_key(query): (provider, query) for provider, query in watch_queries}
+        owned = set(self.claim_keys(list(by_key), now))
+        return [by_key[key] for key in by_key if key in owned]
+
+    def claim_keys(self, keys, now=None):
+        """claim() on query keys; returns the keys this worker leases"""
+        now = time.time() if now is None else now
+        by_key = dict.fromkeys(keys)
+
+        def apply():
+            conn = self._conn
+            conn.execute("INSERT INTO shard_workers (worker_id, heartbeat) VALUES (?, ?) "
+                         "ON CONFLICT (worker_id) DO UPDATE SET heartbeat = excluded.heartbeat",
+                         (self.worker_id, now))
+            conn.execute("DELETE FROM shard_workers WHERE heartbeat < ?", (now - self.lease_seconds,))
+            conn.execute("DELETE FROM shard_leases WHERE expires_at < ?", (now,))
+            live_workers = conn.execute("SELECT COUNT(*) FROM shard_workers").fetchone()[0]
+            fair_share = math.ceil(len(by_key) / max(1, live_workers))
+
+            mine = [key for (key,) in conn.execute(
+                "SELECT query_key FROM shard_leases WHERE worker_id = ? ORDER BY query_key", (self.worker_id,))]
+            # Leases on queries that are no longer watched, then anything above our share
+            dropped = [key for key in mine if key not in by_key]
+            mine = [key for key in mine if key in by_key]
+            dropped += mine[fair_share:]
+            mine = mine[:fair_share]
+            conn.executemany("DELETE FROM shard_leases WHERE query_key = ? AND worker_id = ?",
+                             [(key, self.worker_id) for key in dropped])
+
+            if len(mine) < fair_share:
+                taken = {key for (key,) in conn.execute("SELECT query_key FROM shard_leases")}
+                free = [key for key in by_key if key not in taken]
+                mine += free[:fair_share - len(mine)]
+            conn.executemany(
+                "INSERT INTO shard_leases (query_key, worker_id, expires_at) VALUES (?, ?, ?) "
+                "ON CONFLICT (query_key) DO UPDATE SET expires_at = excluded.expires_at "
+                "WHERE shard_leases.worker_id = excluded.worker_id",
+                [(key, self.worker_id, now + self.lease_seconds) for key in mine],
+            )
+            return live_workers, mine
+
+        live_workers, mine = self._transaction(apply)
+        self.live_workers = live_workers
+        return mine
+
+    def holds(self, query, now=None):
+        """True while this worker's lease on query is unexpired (checked before alerting)"""
+        now = time.time() if now is None else now
+        with self._lock:
+            row = self._conn.execute("SELECT worker_id, expires_at FROM shard_leases WHERE query_key = ?",
+                                     (query_key(query),)).fetchone()
+        return bool(row) and row[0] == self.worker_id and row[1] >= now
+
+    def release(self):
+        """Give up every lease and leave, so the other workers take over straight away"""
+        def apply():
+            self._conn.execute("DELETE FROM shard_leases WHERE worker_id = ?", (self.worker_id,))
+            self._conn.execute("DELETE FROM shard_workers WHERE worker_id = ?", (self.worker_id,))
+        self._transaction(apply)
+
+
+class RemoteShardCoordinator:
+    """ShardCoordinator for workers on several hosts: leases and alert history live on a shard server"""
+
+    def __init__(self, lease_seconds, url=SHARD_SERVER_URL, worker_id=WORKER_ID, token=SHARD_TOKEN):
+        self.lease_seconds = lease_seconds
+        self.url = url
+        self.worker_id = worker_id
+        self.token = token
+        self.live_workers = 0
+        self.alert_store = RemoteAlertStore(self._call)
+        self._held = set()
+        self._held_until = 0.0
+
+    def _call(self, action, payload):
+        headers = {"Authorization": f"Bearer {self.token}"} if self.token else None
+        response = post_json("shard", f"{self.url}/{action}", payload, headers=headers)
+        response.raise_for_status()
+        return response.json()
+
+    def claim(self, watch_queries, now=None):
+        by_key = {query_key(query): (provider, query) for provider, query in watch_queries}
+        # The server's leases run from when it got the request, so timing from before it is on the safe side
+        sent_at = time.monotonic()
+        reply = self._call("claim", {"worker_id": self.worker_id, "queries": list(by_key),
+                                     "lease_seconds": self.lease_seconds})
+        self.live_workers = reply["live_workers"]
+        self._held = set(reply["leases"])
+        self._held_until = sent_at + self.lease_seconds
+        return [by_key[key] for key in by_key if key in self._held]
+
+    def holds(self, query, now=None):
+        """True while the leases of the last claim() are unexpired and include query"""
+        return query_key(query) in self._held and time.monotonic() < self._held_until
+
+    def release(self):
+        self._call("release", {"worker_id": self.worker_id})
+        self._held = set()
+
+
+class RemoteAlertStore:
+    """load_snapshots() and sync() of a StateStore kept by the shard server"""
+
+    def __init__(self, call):
+        self._call = call
+
+    def load_snapshots(self, source, journey_type, coaches=(), key_source=None):
+        key_source = key_source or source
+        reply = self._call("history/load", {"source": source, "journey_type": journey_type})
+        return {(key_source, route, travel_date, coach_no): Snapshot(seats, fare, present)
+                for route, travel_date, coach_no, seats, fare, present in reply["coaches"]}
+
+    def sync(self, source, journey_type, coaches, now=None, keep_dates=()):
+        self._call("history/sync", {
+            "source": source,
+            "journey_type": journey_type,
+            "keep_dates": sorted(keep_dates),
+            "coaches": [[coach.route, coach.travel_date, coach.coach_no, coach.company, coach.seats, coach.fare]
+                        for coach in coaches],
+        })
+
+
+class ShardServer:
+    """What the shard server does for each call, on its own STATE_DB"""
+
+    def __init__(self, path=STATE_DB):
+        self.path = path
+        self.store = StateStore(path)
+        self._coordinators = {}
+        self._lock = threading.Lock()
+
+    def coordinator(self, worker_id, lease_seconds):
+        with self._lock:
+            coordinator = self._coordinators.get(worker_id)
+            if coordinator is None:
+                coordinator = self._coordinators[worker_id] = ShardCoordinator(lease_seconds, self.path, worker_id)
+        coordinator.lease_seconds = lease_seconds
+        return coordinator
+
+    def claim(self, data):
+        coordinator = self.coordinator(data["worker_id"], float(data["lease_seconds"]))
+        leases = coordinator.claim_keys(data["queries"])
+        return {"live_workers": coordinator.live_workers, "leases": leases}
+
+    def release(self, data):
+        self.coordinator(data["worker_id"], 0).release()
+        return {}
+
+    def load_history(self, data):
+        snapshots = self.store.load_snapshots(data["source"], data["journey_type"])
+        return {"coaches": [[route, travel_date, coach_no, snapshot.seats, snapshot.fare, snapshot.present]
+                            for (_, route, travel_date, coach_no), snapshot in snapshots.items()]}
+
+    def sync_history(self, data):
+        source, journey_type = data["source"], data["journey_type"]
+        coaches = [Coach(source, company, coach_no, route, journey_type, travel_date, seats, fare)
+                   for route, travel_date, coach_no, company, seats, fare in data["coaches"]]
+        self.store.sync(source, journey_type, coaches, keep_dates=data["keep_dates"])
+        return {}
+
+
+class ShardHandler(BaseHTTPRequestHandler):
+    service = None
+
+    def log_message(self, format, *args):
+        pass
+
+    def _reply(self, status, payload=None):
+        body = b"" if payload is None else json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        if SHARD_TOKEN and self.headers.get("Authorization") != f"Bearer {SHARD_TOKEN}":
+            self._reply(401, {"error": "unauthorized"})
+            return
+        actions = {
+            "/claim": self.service.claim,
+            "/release": self.service.release,
+            "/history/load": self.service.load_history,
+            "/history/sync": self.service.sync_history,
+        }
+        action = actions.get(self.path)
+        if action is None:
+            self._reply(404, {"error": "not found"})
+            return
+        try:
+            length = int(self.headers.get("Content-Length") or 0)
+            data = json.loads(self.rfile.read(length) or b"null")
+        except ValueError as e:
+            self._reply(400, {"error": str(e)})
+            return
+        try:
+            self._reply(200, action(data))
+        except (KeyError, TypeError, ValueError) as e:
+            self._reply(400, {"error": f"bad request: {e!r}"})
+
+
+def start_shard_server(service, host=SHARD_SERVER_HOST, port=SHARD_SERVER_PORT):
+    """Serve the shard API in a daemon thread"""
+    handler = type("BoundShardHandler", (ShardHandler,), {"service": service})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="shard-api", daemon=True).start()
+    return server
+
+
+def serve_shards():
+    """Run the shard server until interrupted"""
+    server = start_shard_server(ShardServer())
+    log_message(f"Shard server listening on http://{server.server_address[0]}:{server.server_address[1]} "
+                f"(state DB {STATE_DB})")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        log_message("Shard server stopped by user")
+    finally:
+        server.shutdown()
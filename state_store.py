@@ -0,0 +1,212 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from dotenv import load_dotenv
+load_dotenv()
+
+from diff import Snapshot  # noqa: E402
+
+# SQLite file holding everything the monitor has already seen. Point it at a
+# persistent disk on Render so restarts don't re-send old alerts.
+STATE_DB = os.getenv("STATE_DB", "ticket_state.db")
+
+SCHEMA_VERSION = 2
+
+# Coaches are keyed like Coach.key: (source, route, travel_date, coach_no).
+# Rows imported from the JSON caches have no route ('') and are matched on
+# (source, travel_date, coach_no) until the coach is seen again.
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS seen_coaches (
+    source       TEXT NOT NULL,
+    route        TEXT NOT NULL,
+    travel_date  TEXT NOT NULL,
+    coach_no     TEXT NOT NULL,
+    journey_type TEXT NOT NULL,
+    company      TEXT,
+    seats        INTEGER,
+    fare         REAL,
+    present      INTEGER NOT NULL DEFAULT 1,
+    first_seen   REAL NOT NULL,
+    last_seen    REAL NOT NULL,
+    PRIMARY KEY (source, route, travel_date, coach_no)
+);
+CREATE INDEX IF NOT EXISTS idx_seen_journey ON seen_coaches (source, journey_type, present);
+CREATE TABLE IF NOT EXISTS migrations (
+    name TEXT PRIMARY KEY,
+    applied_at REAL NOT NULL
+);
+"""
+
+# Version 1 keyed rows on (source, journey_type, travel_date, coach_no) and had no seats/fare
+MIGRATE_V1 = """
+ALTER TABLE seen_coaches RENAME TO seen_coaches_v1;
+DROP INDEX IF EXISTS idx_seen_present;
+"""
+COPY_V1 = """
+INSERT OR REPLACE INTO seen_coaches
+    (source, route, travel_date, coach_no, journey_type, company, present, first_seen, last_seen)
+SELECT source, COALESCE(route, ''), travel_date, coach_no, journey_type, company, present, first_seen, last_seen
+FROM seen_coaches_v1;
+DROP TABLE seen_coaches_v1;
+"""
+
+
+def scoped_source(source, scope):
+    """Source name for coaches whose history is kept separately from the provider's own
+    (one per subscription, one per sharded query)"""
+    return f"{source}@{scope}"
+
+
+class StateStore:
+    """Transactional store of seen coaches.
+
+    Each sync is one transaction: current coaches are upserted and coaches
+    that disappeared are flagged absent (so they alert again if they come
+    back). A crash mid-cycle leaves the previous state intact.
+    """
+
+    def __init__(self, path=STATE_DB):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._migrate()
+
+    def _migrate(self):
+        version = self._conn.execute("PRAGMA user_version").fetchone()[0]
+        if version >= SCHEMA_VERSION:
+            return
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(seen_coaches)")}
+        steps = [SCHEMA]
+        if columns and "seats" not in columns:
+            steps = [MIGRATE_V1, SCHEMA, COPY_V1]
+        # One script so the whole upgrade commits or rolls back together
+        self._conn.executescript("BEGIN IMMEDIATE;" + "".join(steps) +
+                                 f"PRAGMA user_version = {SCHEMA_VERSION}; COMMIT;")
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def _transaction(self, func, *args):
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                result = func(*args)
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._conn.execute("COMMIT")
+            return result
+
+    def load_snapshots(self, source, journey_type, coaches=(), key_source=None):
+        """{coach key: Snapshot} of what we last recorded for a source and journey.
+
+        Imported rows without a route are attached to the matching coaches passed in.
+        key_source replaces source in the returned keys, for coaches stored under a
+        scoped source (see scoped_source) so they still line up with Coach.key.
+        """
+        key_source = key_source or source
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT route, travel_date, coach_no, seats, fare, present FROM seen_coaches "
+                "WHERE source = ? AND journey_type = ?",
+                (source, journey_type),
+            ).fetchall()
+
+        snapshots = {}
+        unrouted = {}
+        for route, travel_date, coach_no, seats, fare, present in rows:
+            snapshot = Snapshot(seats, fare, bool(present))
+            if route:
+                snapshots[(key_source, route, travel_date, coach_no)] = snapshot
+            else:
+                unrouted[(travel_date, coach_no)] = snapshot
+
+        if unrouted:
+            for coach in coaches:
+                if coach.key not in snapshots and (coach.travel_date, coach.coach_no) in unrouted:
+                    snapshots[coach.key] = unrouted[(coach.travel_date, coach.coach_no)]
+        return snapshots
+
+    def sync(self, source, journey_type, coaches, now=None, keep_dates=()):
+        """Upsert the coaches seen now and flag every other coach of this journey absent.
+
+        Coaches travelling on keep_dates are left as they are: some query for
+        that date has no result this time, so their absence means nothing.
+        """
+        now = time.time() if now is None else now
+        keep_dates = sorted(keep_dates)
+        rows = [(source, coach.route, coach.travel_date, coach.coach_no, journey_type, coach.company,
+                 coach.seats, coach.fare, now, now)
+                for coach in coaches]
+        seen = [(source, coach.travel_date, coach.coach_no) for coach in coaches]
+
+        def apply():
+            self._conn.executemany(
+                """INSERT INTO seen_coaches
+                       (source, route, travel_date, coach_no, journey_type, company, seats, fare,
+                        present, first_seen, last_seen)
+                   VALUES (?, ?, ?, ?, ?, ?, ?, ?, 1, ?, ?)
+                   ON CONFLICT (source, route, travel_date, coach_no) DO UPDATE SET
+                       company = excluded.company, seats = excluded.seats, fare = excluded.fare,
+                       present = 1, last_seen = excluded.last_seen""",
+                rows,
+            )
+            # Imported rows have served their purpose once the coach is seen with a route
+            self._conn.executemany(
+                "DELETE FROM seen_coaches WHERE source = ? AND route = '' AND travel_date = ? AND coach_no = ?",
+                seen,
+            )
+            self._conn.execute(
+                "UPDATE seen_coaches SET present = 0 "
+                "WHERE source = ? AND journey_type = ? AND present = 1 AND last_seen < ? "
+                f"AND travel_date NOT IN ({', '.join('?' * len(keep_dates))})",
+                (source, journey_type, now, *keep_dates),
+            )
+
+        self._transaction(apply)
+
+    def migrate_json_cache(self, source, path, dates_by_journey):
+        """One-time import of a legacy ticket_cache*.json file.
+
+        Legacy rows without a travel_date are assumed to cover every watched
+        date of their journey, matching how the JSON cache was compared.
+        """
+        name = f"json:{source}:{os.path.basename(path)}"
+        with self._lock:
+            if self._conn.execute("SELECT 1 FROM migrations WHERE name = ?", (name,)).fetchone():
+                return 0
+
+        try:
+            with open(path, "r") as f:
+                data = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            data = {}
+        if isinstance(data, list):
+            # Older BusBD caches are a single list shared by both journeys
+            data = {"onward": data, "return": data}
+
+        now = time.time()
+        rows = []
+        for journey_type, dates in dates_by_journey:
+            for ticket in data.get(journey_type.lower(), []):
+                ticket_dates = [ticket["travel_date"]] if ticket.get("travel_date") else dates
+                rows.extend((source, "", travel_date, ticket["coach_no"], journey_type, now, now)
+                            for travel_date in ticket_dates)
+
+        def apply():
+            self._conn.executemany(
+                """INSERT OR IGNORE INTO seen_coaches
+                       (source, route, travel_date, coach_no, journey_type, present, first_seen, last_seen)
+                   VALUES (?, ?, ?, ?, ?, 1, ?, ?)""",
+                rows,
+            )
+            self._conn.execute("INSERT INTO migrations (name, applied_at) VALUES (?, ?)", (name, now))
+
+        self._transaction(apply)
+        return len(rows)
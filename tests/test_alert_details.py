@@ -0,0 +1,64 @@
+import threading
+
+import pytest
+
+import details
+import main_unified as monitor
+from diff import NEW_COACH, Event
+from providers import Coach, CoachDetail, Provider
+
+
+class SlowDetailProvider(Provider):
+    name = "SlowDetail"
+    detail_url = "https://detail.invalid/trip"
+
+    def __init__(self):
+        super().__init__()
+        self.release = threading.Event()
+
+    def fetch_detail(self, coach):
+        self.release.wait(5)
+        return CoachDetail("08:30", None, [], None, [])
+
+
+class RecordingNotifier:
+    def __init__(self):
+        self.sent = []
+
+    def notify(self, title, body, source=None):
+        self.sent.append((title, body, source))
+
+
+@pytest.fixture
+def provider(monkeypatch):
+    provider = SlowDetailProvider()
+    monkeypatch.setattr(monitor, "DETAIL_LOOKUPS", True)
+    monkeypatch.setattr(monitor, "get_provider", lambda name: provider)
+    monkeypatch.setattr(details, "_cache", details.DetailCache())
+    yield provider
+    provider.release.set()
+
+
+def new_coach_event(provider):
+    coach = Coach(provider.name, "National Travels", "X1", "dhaka-to-rajshahi", "Onward", "2030-01-05",
+                  seats=4, trip_id="t1")
+    return Event(NEW_COACH, coach, None)
+
+
+def test_alert_waits_for_detail_without_blocking_the_caller(provider):
+    notifier = RecordingNotifier()
+    monitor.send_notification([new_coach_event(provider)], "Onward", provider.name, notifier)
+    # Returned while the lookup is still running; nothing queued yet
+    assert notifier.sent == []
+
+    provider.release.set()
+    monitor.wait_for_alerts(timeout=5)
+    assert len(notifier.sent) == 1
+    assert "Departs 08:30" in notifier.sent[0][1]
+
+
+def test_alert_without_lookups_is_queued_at_once(provider, monkeypatch):
+    monkeypatch.setattr(monitor, "DETAIL_LOOKUPS", False)
+    notifier = RecordingNotifier()
+    monitor.send_notification([new_coach_event(provider)], "Onward", provider.name, notifier)
+    assert len(notifier.sent) == 1
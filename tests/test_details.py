@@ -0,0 +1,65 @@
+import details
+from details import DetailCache, get_detail
+from providers import Coach, CoachDetail, get_provider
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_cache_expires_and_evicts_least_recently_used():
+    clock = Clock()
+    cache = DetailCache(ttl=10, size=2, clock=clock)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    assert cache.get("a") == (True, 1)
+    cache.put("c", 3)
+    assert cache.get("b") == (False, None)
+    clock.now = 11
+    assert cache.get("a") == (False, None)
+    assert len(cache) == 1
+
+
+class OneDetail:
+    name = "OneDetail"
+
+    def __init__(self):
+        self.calls = 0
+
+    def fetch_detail(self, coach):
+        self.calls += 1
+        return CoachDetail("08:30", None, [], None, [])
+
+
+def test_injected_empty_cache_is_used(monkeypatch):
+    monkeypatch.setattr(details, "_cache", DetailCache())
+    cache = DetailCache()
+    provider = OneDetail()
+    coach = Coach("OneDetail", "National Travels", "X1", "dhaka-to-rajshahi", "Onward", "2030-01-05", seats=4)
+    get_detail(provider, coach, cache)
+    get_detail(provider, coach, cache)
+    assert provider.calls == 1
+    assert len(cache) == 1
+    assert len(details.get_cache()) == 0
+
+
+def test_parse_detail_reads_each_providers_fields():
+    bdtickets = get_provider("BDTickets").parse_detail(None, {"data": {
+        "departureTime": "08:30", "arrivalTime": "14:15",
+        "boardingPoints": [{"pointName": "Gabtoli"}, "Kalyanpur"],
+        "seatLayout": [{"seatNo": "A1", "isAvailable": True, "seatFare": 850},
+                       {"seatNo": "A2", "isAvailable": False, "seatFare": 850},
+                       {"seatNo": "B1", "status": "available", "fare": 1200}],
+    }})
+    assert bdtickets == CoachDetail("08:30", "14:15", ["Gabtoli", "Kalyanpur"], ["A1", "B1"], [850.0, 1200.0])
+
+    busbd = get_provider("BusBD").parse_detail(None, {"data": {
+        "dep_time": "21:00", "boarding_points": [{"counter_name": "Kallyanpur"}],
+        "seat_layout": [{"seat_number": "C3", "is_available": "1", "seat_fare": 700}],
+    }})
+    assert busbd == CoachDetail("21:00", None, ["Kallyanpur"], ["C3"], [700.0])
+    assert get_provider("BusBD").parse_detail(None, {"data": None}) == CoachDetail(None, None, [], None, [])
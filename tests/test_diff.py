@@ -0,0 +1,48 @@
+from diff import FARE_CHANGED, NEW_COACH, SEATS_LOW, SEATS_REOPENED, Snapshot, describe_event, diff_coaches
+from providers import Coach
+
+
+def coach(coach_no="X1", seats=5, fare=850.0, travel_date="2030-01-05"):
+    return Coach("BDTickets", "National Travels", coach_no, "dhaka-to-rajshahi", "Onward", travel_date, seats, fare)
+
+
+def kinds(previous, coaches, **kwargs):
+    kwargs.setdefault("low_seats", 0)
+    kwargs.setdefault("fare_changes", True)
+    return sorted((event.kind, event.coach.coach_no) for event in diff_coaches(previous, coaches, **kwargs))
+
+
+def test_new_coaches_alert_unless_sold_out():
+    assert kinds({}, [coach("X1"), coach("X2", seats=0), coach("X3", seats=None)]) == [
+        (NEW_COACH, "X1"), (NEW_COACH, "X3")]
+
+
+def test_seats_back_after_sold_out_or_missing():
+    previous = {coach("X1").key: Snapshot(0, 850.0, True), coach("X2").key: Snapshot(4, 850.0, False)}
+    assert kinds(previous, [coach("X1"), coach("X2")]) == [(SEATS_REOPENED, "X1"), (SEATS_REOPENED, "X2")]
+
+
+def test_unchanged_and_sold_out_coaches_are_quiet():
+    previous = {coach("X1").key: Snapshot(5, 850.0, True), coach("X2").key: Snapshot(5, 850.0, True)}
+    assert kinds(previous, [coach("X1"), coach("X2", seats=0, fare=999.0)]) == []
+
+
+def test_low_seats_alert_once_when_crossing_the_threshold():
+    previous = {coach().key: Snapshot(8, 850.0, True)}
+    assert kinds(previous, [coach(seats=2)], low_seats=3) == [(SEATS_LOW, "X1")]
+    previous = {coach().key: Snapshot(2, 850.0, True)}
+    assert kinds(previous, [coach(seats=1)], low_seats=3) == []
+
+
+def test_fare_changes_need_both_fares_and_can_be_turned_off():
+    previous = {coach().key: Snapshot(5, 850.0, True)}
+    events = diff_coaches(previous, [coach(fare=900.0)], low_seats=0, fare_changes=True)
+    assert [event.kind for event in events] == [FARE_CHANGED]
+    assert describe_event(events[0]).endswith("fare 850 -> 900")
+    assert kinds(previous, [coach(fare=900.0)], fare_changes=False) == []
+    assert kinds({coach().key: Snapshot(5, None, True)}, [coach(fare=900.0)]) == []
+
+
+def test_same_coach_number_on_another_date_is_another_coach():
+    previous = {coach().key: Snapshot(5, 850.0, True)}
+    assert kinds(previous, [coach(travel_date="2030-01-06")]) == [(NEW_COACH, "X1")]
@@ -0,0 +1,41 @@
+import os
+
+from history import COLUMN_FILES, HistoryWriter, Partition, coach_changes
+from providers import Coach, Query
+
+QUERY = Query("BDTickets", "Onward", "2030-01-05", "dhaka-to-rajshahi", ())
+
+
+def coach(seats, fare=850.0):
+    return Coach("BDTickets", "National Travels", "X1", QUERY.route, "Onward", QUERY.travel_date, seats, fare)
+
+
+def write(path, responses):
+    writer = HistoryWriter(str(path), "w1")
+    for when, coaches in responses:
+        writer.record(QUERY, coaches, when)
+    writer.flush()
+    return os.path.join(str(path), "w1")
+
+
+def test_changes_are_read_back_in_order(tmp_path):
+    partition = Partition(write(tmp_path, [(100, [coach(0)]), (200, [coach(4)]), (300, [coach(4, 900.0)]),
+                                           (400, [coach(0, 900.0)]), (500, [])]))
+    kinds = [(when, kind) for when, kind, *_ in coach_changes(partition, None)]
+    assert kinds == [(200, "released"), (300, "fare"), (400, "sold_out"), (500, "gone")]
+
+
+def test_columns_left_uneven_by_a_crash_are_cut_back_before_appending(tmp_path):
+    directory = write(tmp_path, [(100, [coach(3)])])
+    # A crash after appending to some columns (and half a value to one of them)
+    with open(os.path.join(directory, COLUMN_FILES["time"]), "ab") as f:
+        f.write(b"\x01\x00\x00\x00\x02\x00")
+    with open(os.path.join(directory, COLUMN_FILES["query"]), "ab") as f:
+        f.write(b"\x01\x00\x00\x00")
+
+    write(tmp_path, [(200, [coach(0)])])
+    partition = Partition(directory)
+    assert partition.rows == 4
+    assert sorted({len(column) for column in partition.columns.values()}) == [4]
+    assert [row[0] for row in partition.scan()] == [100, 100, 200, 200]
+    assert [kind for _, kind, *_ in coach_changes(partition, None)] == ["sold_out"]
@@ -0,0 +1,40 @@
+import json
+
+import pytest
+
+from json_stream import iter_array
+
+BUSBD_PATH = ("data", "coaches")
+
+
+@pytest.mark.parametrize("body", [
+    '{"data": []}',
+    '{"data": ""}',
+    '{"data": null}',
+    '{"data": 0}',
+    '{"data": false}',
+    '{"data": {}}',
+    '{"data": {"coaches": null}}',
+    '{"data": {"coaches": []}}',
+    '{"status": "ok"}',
+    '{}',
+    '[]',
+])
+def test_missing_or_empty_path_yields_nothing(body):
+    assert list(iter_array(body, BUSBD_PATH)) == []
+
+
+def test_yields_records_and_skips_sibling_fields():
+    data = {"meta": {"note": "} ] {"}, "data": {"total": 2, "coaches": [{"company_name": "A"}, {"c": [1, None]}]}}
+    assert list(iter_array(json.dumps(data, indent=2), BUSBD_PATH)) == data["data"]["coaches"]
+
+
+@pytest.mark.parametrize("body", ['{"data": [{"x": 1}', '{"data": [1 2]}', '', '{"data": "unterminated}'])
+def test_invalid_json_raises(body):
+    with pytest.raises(ValueError):
+        list(iter_array(body, ("data",)))
+
+
+def test_non_list_at_the_end_of_the_path_raises():
+    with pytest.raises(ValueError):
+        list(iter_array('{"data": {"coaches": {"a": 1}}}', BUSBD_PATH))
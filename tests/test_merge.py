@@ -0,0 +1,38 @@
+from merge import MERGED_SOURCE, merge_coaches, route_places
+from providers import Coach
+
+
+def coach(source, coach_no, departure="08:30 AM", seats=5, fare=850.0, route="dhaka-to-rajshahi",
+          company="National Travels", coach_type="AC"):
+    return Coach(source, company, coach_no, route, "Onward", "2030-01-05", seats, fare, departure, coach_type)
+
+
+def test_route_places():
+    assert route_places("dhaka-to-rajshahi") == ("dhaka", "rajshahi")
+    assert route_places("Dhaka - Rajshahi") == route_places("Dhaka to Rajshahi") == ("dhaka", "rajshahi")
+    assert route_places("14->55") == ("14", "55")
+    assert route_places("dhaka") is None
+
+
+def test_same_departure_from_two_providers_is_one_coach_with_the_best_offer():
+    merged = merge_coaches([coach("BDTickets", "A1", fare=900.0),
+                            coach("BusBD", "B7", "08:30", fare=850.0, route="Dhaka - Rajshahi")])
+    assert len(merged) == 1
+    assert merged[0].source == MERGED_SOURCE
+    assert [offer.source for offer in merged[0].offers] == ["BusBD", "BDTickets"]
+    assert merged[0].fare == 850.0
+
+
+def test_look_alike_coaches_of_one_provider_stay_apart():
+    # BDTickets lists two coaches that look the same: which one is BusBD's can't be told
+    coaches = [coach("BDTickets", "A1"), coach("BDTickets", "A2"), coach("BusBD", "B7")]
+    merged = merge_coaches(coaches)
+    assert len(merged) == 3
+    assert all(len(item.offers) == 1 for item in merged)
+    assert len({item.key for item in merged}) == 3
+    assert sorted(item.display_no for item in merged) == ["A1", "A2", "B7"]
+
+
+def test_coaches_without_departure_time_are_not_merged():
+    merged = merge_coaches([coach("BDTickets", "A1", departure=None), coach("BusBD", "B7", departure=None)])
+    assert len(merged) == 2
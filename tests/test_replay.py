@@ -0,0 +1,73 @@
+import gzip
+import json
+
+import pytest
+
+import main_unified as monitor
+from diff import EVENT_LABELS
+from fingerprints import ResponseCache
+from state_store import StateStore
+
+TRAVEL_DATE = "2030-01-05"
+
+
+@pytest.fixture
+def alerts(tmp_path, monkeypatch):
+    sent = []
+    monkeypatch.setattr(monitor, "_state_store", StateStore(str(tmp_path / "state.db")))
+    monkeypatch.setattr(monitor, "response_cache", ResponseCache())
+    monkeypatch.setattr(monitor, "send_notification",
+                        lambda events, journey_type, source: sent.extend(
+                            (EVENT_LABELS[event.kind], event.coach.coach_no) for event in events))
+    return sent
+
+
+def capture_record(cycle, route, coaches=None, error=None):
+    record = {"time": 1.0 + cycle, "cycle": str(cycle), "provider": "BDTickets", "journey": "Onward",
+              "date": TRAVEL_DATE, "route": route,
+              "params": [["date", TRAVEL_DATE], ["identifier", route], ["structureType", "BUS"]]}
+    if error:
+        record["error"] = error
+    else:
+        record.update(status=200, headers={}, body=json.dumps({"data": [
+            {"companyName": "National Travels", "coachNo": coach_no, "availableSeats": seats}
+            for coach_no, seats in coaches or []]}))
+    return record
+
+
+def write_captures(path, records):
+    with gzip.open(path, "wt", encoding="utf-8") as f:
+        for record in records:
+            f.write(json.dumps(record) + "\n")
+    return str(path)
+
+
+def test_partial_cycles_do_not_flag_other_queries_absent(tmp_path, alerts):
+    # Adaptive polling captures only the queries that were due in each cycle
+    path = write_captures(tmp_path / "capture.jsonl.gz", [
+        capture_record(1, "dhaka-to-rajshahi", [("X1", 10)]),
+        capture_record(2, "dhaka-to-chapainawabganj", [("Y1", 4)]),
+        capture_record(3, "dhaka-to-rajshahi", [("X1", 9)]),
+    ])
+    assert monitor.replay_captures([path]) == 3
+    assert alerts == [("New", "X1"), ("New", "Y1")]
+
+
+def test_failed_query_keeps_its_last_result(tmp_path, alerts):
+    path = write_captures(tmp_path / "capture.jsonl.gz", [
+        capture_record(1, "dhaka-to-rajshahi", [("X1", 10)]),
+        capture_record(2, "dhaka-to-rajshahi", error="timed out"),
+        capture_record(3, "dhaka-to-rajshahi", [("X1", 10)]),
+    ])
+    monitor.replay_captures([path])
+    assert alerts == [("New", "X1")]
+
+
+def test_coach_gone_from_its_own_query_alerts_when_back(tmp_path, alerts):
+    path = write_captures(tmp_path / "capture.jsonl.gz", [
+        capture_record(1, "dhaka-to-rajshahi", [("X1", 10)]),
+        capture_record(2, "dhaka-to-rajshahi", []),
+        capture_record(3, "dhaka-to-rajshahi", [("X1", 3)]),
+    ])
+    monitor.replay_captures([path])
+    assert alerts == [("New", "X1"), ("Seats back", "X1")]
@@ -0,0 +1,97 @@
+from datetime import datetime, timezone
+
+import pytest
+
+from resilience import CLOSED, HALF_OPEN, OPEN, CircuitBreaker, ProviderGuard, TokenBucket, parse_retry_after
+
+NOW = datetime(2030, 1, 5, 12, 0, 0, tzinfo=timezone.utc)
+
+
+@pytest.mark.parametrize("value, seconds", [
+    ("120", 120.0),
+    (" 7 ", 7.0),
+    ("Sat, 05 Jan 2030 12:01:30 GMT", 90.0),
+    ("Sat, 05 Jan 2030 12:01:30 +0000", 90.0),
+    ("Sat, 05 Jan 2030 12:01:30 -0000", 90.0),
+    ("Sat, 05 Jan 2030 11:00:00 GMT", 0.0),
+    ("soon", None),
+    ("", None),
+    (None, None),
+])
+def test_parse_retry_after(value, seconds):
+    assert parse_retry_after(value, NOW) == seconds
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class Response:
+    def __init__(self, status_code, retry_after=None):
+        self.status_code = status_code
+        self.headers = {"Retry-After": retry_after} if retry_after else {}
+
+
+def test_breaker_opens_after_consecutive_failures_and_probes_once():
+    clock = Clock()
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=60, clock=clock)
+    breaker.record_failure()
+    breaker.record_success()
+    breaker.record_failure()
+    assert breaker.allow() and breaker.state == CLOSED
+    breaker.record_failure()
+    assert breaker.state == OPEN and not breaker.allow()
+
+    clock.now = 60
+    assert breaker.allow() and breaker.state == HALF_OPEN
+    # Only one probe at a time
+    assert not breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == OPEN and not breaker.allow()
+
+    clock.now = 120
+    assert breaker.allow()
+    breaker.record_success()
+    assert breaker.state == CLOSED and breaker.allow()
+
+
+def test_unused_probe_is_given_back():
+    clock = Clock()
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=10, clock=clock)
+    breaker.record_failure()
+    clock.now = 10
+    assert breaker.allow()
+    breaker.release_probe()
+    assert breaker.allow()
+
+
+def test_block_for_holds_requests_even_when_closed():
+    clock = Clock()
+    breaker = CircuitBreaker(clock=clock)
+    breaker.block_for(30)
+    assert not breaker.allow()
+    clock.now = 30
+    assert breaker.allow()
+
+
+def test_retry_after_date_blocks_the_provider():
+    guard = ProviderGuard("Test", 0, 1)
+    guard.breaker.clock = Clock()
+    guard.record_response(Response(429, "Sat, 05 Jan 2030 12:01:30 -0000"))
+    assert guard.breaker.failures == 1
+    assert guard.breaker.blocked_until > 0
+    assert not guard.breaker.allow()
+
+
+def test_token_bucket_books_ahead_when_empty():
+    clock = Clock()
+    bucket = TokenBucket(rate=2, burst=1, clock=clock)
+    assert bucket.reserve() == 0
+    assert bucket.reserve() == 0.5
+    bucket.cancel()
+    clock.now = 0.5
+    assert bucket.reserve() == 0
@@ -0,0 +1,45 @@
+from datetime import date, datetime, timedelta
+
+from scheduler import QueryScheduler
+
+TODAY = datetime(2030, 1, 5, 9, 0).timestamp()
+
+
+def scheduler(**kwargs):
+    return QueryScheduler(60, 1800, jitter=0, clock=lambda: TODAY, **kwargs)
+
+
+def test_past_dates_are_not_added():
+    queries = scheduler()
+    queries.add("old", "2030-01-04")
+    queries.add("today", "2030-01-05")
+    assert "old" not in queries
+    assert queries.pop_due() == ["today"]
+
+
+def test_a_query_is_dropped_once_its_date_has_passed():
+    queries = scheduler()
+    queries.add("q", "2030-01-05")
+    queries.pop_due()
+    queries.record("q", "a")
+    assert "q" in queries
+
+    next_day = datetime(2030, 1, 6, 0, 5).timestamp()
+    queries.pop_due(now=next_day)
+    queries.record("q", "a", now=next_day)
+    assert "q" not in queries
+    assert queries.next_deadline() is None
+
+
+def test_interval_shrinks_near_departure_and_when_results_change():
+    queries = scheduler()
+    today = date(2030, 1, 5)
+    queries.add("near", today.isoformat())
+    queries.add("far", (today + timedelta(days=60)).isoformat())
+    assert queries.interval("near", today) < queries.interval("far", today)
+
+    queries.pop_due()
+    for signature in ("a", "b", "c", "d"):
+        queries.record("near", signature)
+        queries.record("far", "same")
+    assert queries.change_rate("near") > queries.change_rate("far") == 0
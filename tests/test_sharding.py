@@ -0,0 +1,62 @@
+import pytest
+
+from providers import Coach, Query
+from sharding import RemoteShardCoordinator, ShardCoordinator, ShardServer, start_shard_server
+
+WATCH = [(None, Query("BDTickets", "Onward", f"2030-01-0{day}", route, ()))
+         for day in range(1, 4) for route in ("dhaka-to-rajshahi", "dhaka-to-chapainawabganj")]
+
+
+def owned(pairs):
+    return {query for _, query in pairs}
+
+
+def test_workers_split_the_watch_list_and_take_over_expired_leases(tmp_path):
+    path = str(tmp_path / "state.db")
+    first = ShardCoordinator(60, path, "w1")
+    second = ShardCoordinator(60, path, "w2")
+    assert len(first.claim(WATCH, now=0)) == 6
+    second.claim(WATCH, now=1)
+    # The first worker hands over its extra leases on its next cycle
+    mine = owned(first.claim(WATCH, now=2))
+    theirs = owned(second.claim(WATCH, now=3))
+    assert len(mine) == len(theirs) == 3
+    assert not mine & theirs
+
+    # w1 stops renewing: w2 takes everything once the leases expire
+    assert len(second.claim(WATCH, now=100)) == 6
+    assert not first.holds(WATCH[0][1], now=100)
+
+
+@pytest.fixture
+def shard_url(tmp_path):
+    server = start_shard_server(ShardServer(str(tmp_path / "server.db")), "127.0.0.1", 0)
+    yield f"http://127.0.0.1:{server.server_address[1]}"
+    server.shutdown()
+
+
+def test_remote_workers_share_leases_through_the_shard_server(shard_url):
+    first = RemoteShardCoordinator(60, shard_url, "host-a")
+    second = RemoteShardCoordinator(60, shard_url, "host-b")
+    first.claim(WATCH)
+    second.claim(WATCH)
+    mine = owned(first.claim(WATCH))
+    theirs = owned(second.claim(WATCH))
+    assert mine | theirs == owned(WATCH)
+    assert not mine & theirs
+    assert second.live_workers == 2
+    assert all(first.holds(query) for query in mine)
+
+    first.release()
+    assert owned(second.claim(WATCH)) == owned(WATCH)
+
+
+def test_alert_history_is_kept_on_the_shard_server(shard_url):
+    coach = Coach("BDTickets", "National Travels", "X1", "dhaka-to-rajshahi", "Onward", "2030-01-05", seats=4)
+    source = "BDTickets@dhaka-to-rajshahi|2030-01-05"
+    RemoteShardCoordinator(60, shard_url, "host-a").alert_store.sync(source, "Onward", [coach])
+
+    snapshots = RemoteShardCoordinator(60, shard_url, "host-b").alert_store.load_snapshots(
+        source, "Onward", key_source="BDTickets")
+    assert snapshots[coach.key].seats == 4
+    assert snapshots[coach.key].present
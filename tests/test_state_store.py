@@ -0,0 +1,41 @@
+import pytest
+
+from providers import Coach
+from state_store import StateStore, scoped_source
+
+ROUTE = "dhaka-to-rajshahi"
+
+
+def coach(coach_no, travel_date="2030-01-05", seats=5, fare=850.0):
+    return Coach("BDTickets", "National Travels", coach_no, ROUTE, "Onward", travel_date, seats, fare)
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = StateStore(str(tmp_path / "state.db"))
+    yield store
+    store.close()
+
+
+def test_sync_records_coaches_and_flags_missing_ones_absent(store):
+    store.sync("BDTickets", "Onward", [coach("X1"), coach("X2", seats=0)], now=1)
+    store.sync("BDTickets", "Onward", [coach("X1", seats=3)], now=2)
+    snapshots = store.load_snapshots("BDTickets", "Onward")
+    assert snapshots[coach("X1").key] == (3, 850.0, True)
+    assert snapshots[coach("X2").key] == (0, 850.0, False)
+
+
+def test_sync_leaves_coaches_of_keep_dates_alone(store):
+    store.sync("BDTickets", "Onward", [coach("X1"), coach("Y1", "2030-01-06")], now=1)
+    # The 2030-01-06 query has no result this time: its coaches are not gone
+    store.sync("BDTickets", "Onward", [], now=2, keep_dates={"2030-01-06"})
+    snapshots = store.load_snapshots("BDTickets", "Onward")
+    assert not snapshots[coach("X1").key].present
+    assert snapshots[coach("Y1", "2030-01-06").key].present
+
+
+def test_scoped_history_is_kept_apart_and_keyed_like_the_provider(store):
+    source = scoped_source("BDTickets", "sub1")
+    store.sync(source, "Onward", [coach("X1")], now=1)
+    assert store.load_snapshots("BDTickets", "Onward") == {}
+    assert list(store.load_snapshots(source, "Onward", key_source="BDTickets")) == [coach("X1").key]
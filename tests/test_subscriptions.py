@@ -0,0 +1,71 @@
+import json
+import urllib.error
+import urllib.request
+
+import pytest
+
+import daemon
+
+ROUTE = "dhaka-to-rajshahi"
+
+
+def body(**changes):
+    data = {"provider": "BDTickets", "route": ROUTE, "dates": ["2030-01-05"],
+            "notify": {"type": "webhook", "url": "https://example.invalid/hook"}}
+    data.update(changes)
+    return data
+
+
+def test_valid_subscription():
+    subscription = daemon.parse_subscription(body(dates="2030-01-05..2030-01-06"))
+    assert (subscription.provider, subscription.route) == ("BDTickets", ROUTE)
+    assert subscription.dates == ["2030-01-05", "2030-01-06"]
+
+
+@pytest.mark.parametrize("data", [
+    None,
+    [],
+    body(provider=["x"]),
+    body(provider="Nobody"),
+    body(dates=20300105),
+    body(dates=["2030-01-05", 5]),
+    body(dates="not a date"),
+    body(dates="2020-01-05"),
+    body(route=["dhaka"]),
+    body(route="nowhere"),
+    body(companies="National Travels"),
+    body(notify="webhook"),
+    body(notify={"type": ["webhook"]}),
+    body(notify={"type": "file", "path": "/tmp/alerts"}),
+    body(notify={"type": "webhook", "url": 5}),
+    body(notify={"type": "smtp", "recipients": ["a@b"]}),
+    body(notify={"type": "pushbullet"}),
+])
+def test_malformed_subscription_is_a_client_error(data):
+    with pytest.raises(ValueError):
+        daemon.parse_subscription(data)
+
+
+@pytest.fixture
+def api(tmp_path):
+    service = daemon.SubscriptionDaemon(daemon.SubscriptionStore(str(tmp_path / "subscriptions.db")))
+    server = daemon.start_api(service, "127.0.0.1", 0)
+    yield f"http://127.0.0.1:{server.server_address[1]}"
+    server.shutdown()
+
+
+def post(url, data):
+    request = urllib.request.Request(f"{url}/subscriptions", json.dumps(data).encode("utf-8"), method="POST")
+    try:
+        with urllib.request.urlopen(request, timeout=5) as response:
+            return response.status, json.loads(response.read())
+    except urllib.error.HTTPError as e:
+        return e.code, json.loads(e.read())
+
+
+def test_post_answers_400_for_wrong_types(api):
+    status, reply = post(api, body(dates=["2030-01-05", 5]))
+    assert status == 400
+    assert "dates" in reply["error"]
+    status, _ = post(api, body())
+    assert status == 201
@@ -0,0 +1,42 @@
+from datetime import date, timedelta
+
+# Longest date window we expand, to keep a typo like 2026-03-01..2027-03-01 from
+# turning into thousands of queries
+MAX_WINDOW_DAYS = 62
+
+def parse_dates(value):
+    """Expand a date setting into a sorted list of YYYY-MM-DD strings.
+
+    Accepts a single date ("2026-03-04"), an inclusive range
+    ("2026-03-03..2026-03-07") or a comma separated mix of both.
+    """
+    dates = set()
+    for part in (value or "").split(","):
+        part = part.strip()
+        if not part:
+            continue
+        if ".." in part:
+            first, last = (date.fromisoformat(p.strip()) for p in part.split("..", 1))
+            if last < first:
+                first, last = last, first
+            days = (last - first).days
+            if days >= MAX_WINDOW_DAYS:
+                raise ValueError(f"Date window {part} is longer than {MAX_WINDOW_DAYS} days")
+            dates.update((first + timedelta(days=i)).isoformat() for i in range(days + 1))
+        else:
+            dates.add(date.fromisoformat(part).isoformat())
+    return sorted(dates)
+
+def build_watch_queries(providers, journeys):
+    """Every (provider, query) pair for the given journeys.
+
+    journeys is a list of (journey_type, dates) pairs, e.g.
+    [("Onward", ["2026-03-03", "2026-03-04"]), ("Return", ["2026-03-28"])].
+    """
+    return [
+        (provider, query)
+        for provider in providers
+        for journey_type, dates in journeys
+        for travel_date in dates
+        for query in provider.build_queries(travel_date, journey_type)
+    ]